@@ -0,0 +1,131 @@
+import os
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS facts (
+    report TEXT NOT NULL,
+    item TEXT NOT NULL,
+    period TEXT,
+    value REAL NOT NULL,
+    unit TEXT,
+    page INTEGER NOT NULL,
+    pages TEXT NOT NULL,
+    occurrences INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_facts_item_period ON facts (item, period);
+CREATE INDEX IF NOT EXISTS idx_facts_report_item ON facts (report, item);
+CREATE TABLE IF NOT EXISTS reports (
+    report TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    fact_count INTEGER NOT NULL,
+    loaded_at TEXT NOT NULL
+);
+"""
+
+
+class FinancialFactStore:
+    """財務數值事實表 (SQLite): 每份報告的 (item, period, value, unit) 跨頁去重，可依項目與期間查詢"""
+
+    def __init__(self, db_path="outputs/financial_facts.db"):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # 每次操作各自連線 (結束時提交並關閉)，可在多個執行緒中使用
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def load_report(self, report, page_records, source):
+        """以逐頁結構化紀錄重建報告的事實，source (解析產物雜湊) 未變時略過，回傳事實筆數"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT source, fact_count FROM reports WHERE report = ?", (report,)).fetchone()
+            if row and row['source'] == source:
+                return row['fact_count']
+
+        facts = {}
+        for record in page_records:
+            for item, values in record.get('financial_data', {}).items():
+                for fact in values:
+                    key = (item, fact.get('period'), fact['value'], fact.get('unit'))
+                    entry = facts.get(key)
+                    if entry is None:
+                        facts[key] = entry = {'pages': [], 'occurrences': 0}
+                    entry['occurrences'] += 1
+                    if fact['page'] not in entry['pages']:
+                        entry['pages'].append(fact['page'])
+
+        rows = [
+            (report, item, period, value, unit, min(entry['pages']), json.dumps(sorted(entry['pages'])),
+             entry['occurrences'])
+            for (item, period, value, unit), entry in facts.items()
+        ]
+
+        with self._connect() as conn:
+            conn.execute("DELETE FROM facts WHERE report = ?", (report,))
+            conn.executemany("INSERT INTO facts VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute(
+                "INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?)",
+                (report, source, len(rows), datetime.now().isoformat())
+            )
+
+        return len(rows)
+
+    def query(self, item=None, period=None, report=None, order_by="report, item, period, occurrences DESC, page"):
+        """依項目、期間、報告篩選 (None表示不限)"""
+        conditions, params = [], []
+        for column, value in (('item', item), ('period', period), ('report', report)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+
+        sql = "SELECT * FROM facts"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {order_by}"
+
+        with self._connect() as conn:
+            return [self._row_to_fact(row) for row in conn.execute(sql, params)]
+
+    def lookup(self, report, item, period=None):
+        """取得單一數值: 同一項目與期間有多個值時取出現最多次者，未指定期間時同次數優先取最新期間"""
+        facts = self.query(item=item, period=period, report=report, order_by="occurrences DESC, period DESC, page")
+        return facts[0] if facts else None
+
+    def periods(self, report=None, item=None):
+        sql = "SELECT DISTINCT period FROM facts WHERE period IS NOT NULL"
+        params = []
+        if report is not None:
+            sql += " AND report = ?"
+            params.append(report)
+        if item is not None:
+            sql += " AND item = ?"
+            params.append(item)
+
+        with self._connect() as conn:
+            return sorted((row['period'] for row in conn.execute(sql, params)), reverse=True)
+
+    def items(self, report=None):
+        sql = "SELECT DISTINCT item FROM facts"
+        params = []
+        if report is not None:
+            sql += " WHERE report = ?"
+            params.append(report)
+
+        with self._connect() as conn:
+            return sorted(row['item'] for row in conn.execute(sql, params))
+
+    def _row_to_fact(self, row):
+        fact = dict(row)
+        fact['pages'] = json.loads(fact['pages'])
+        return fact
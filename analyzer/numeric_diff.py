@@ -0,0 +1,164 @@
+import numpy as np
+
+ITEM_NAMES = {
+    'revenue': '營業收入',
+    'cost_of_revenue': '營業成本',
+    'gross_profit': '營業毛利',
+    'operating_expenses': '營業費用',
+    'rd_expense': '研究發展費用',
+    'operating_income': '營業利益',
+    'pre_tax_income': '稅前淨利',
+    'income_tax': '所得稅費用',
+    'net_income': '本期淨利',
+    'eps': '每股盈餘',
+    'total_assets': '資產總額',
+    'current_assets': '流動資產',
+    'total_liabilities': '負債總額',
+    'current_liabilities': '流動負債',
+    'total_equity': '權益總額',
+    'cash': '現金及約當現金',
+    'operating_cash_flow': '營業活動淨現金流量',
+    'investing_cash_flow': '投資活動淨現金流量',
+    'capex': '資本支出',
+    'dividends': '發放現金股利',
+}
+
+
+class NumericDiffEngine:
+    """以事實表對齊兩份報告的 (項目, 期間)，用NumPy一次計算差額、變動率與倍數"""
+
+    def __init__(self, fact_store):
+        self.fact_store = fact_store
+        # 最近一次compare中因數值衝突而略過的 (報告, 項目, 期間)
+        self.conflicts = []
+
+    def compare(self, report_a, report_b, items=None):
+        """回傳 {item: 比較列}，items為None時比較兩份報告共有的所有項目"""
+        self.conflicts = []
+        facts_a = self._best_facts(report_a)
+        facts_b = self._best_facts(report_b)
+
+        if items is None:
+            items = sorted({item for item, _ in facts_a} & {item for item, _ in facts_b})
+
+        rows = []
+        for item in items:
+            rows.extend(self._align_item(item, facts_a, facts_b))
+
+        if not rows:
+            return {}
+
+        value_a = np.array([row['value_a'] for row in rows], dtype=float)
+        value_b = np.array([row['value_b'] for row in rows], dtype=float)
+        delta = value_b - value_a
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta_pct = np.where(value_a != 0, delta / np.abs(value_a) * 100, np.nan)
+            ratio = np.where(value_a != 0, value_b / value_a, np.nan)
+
+        diffs = {}
+        for i, row in enumerate(rows):
+            row['delta'] = float(delta[i])
+            row['delta_pct'] = None if np.isnan(delta_pct[i]) else round(float(delta_pct[i]), 2)
+            row['ratio'] = None if np.isnan(ratio[i]) else round(float(ratio[i]), 4)
+            diffs.setdefault(row['item'], []).append(row)
+
+        return diffs
+
+    def _best_facts(self, report):
+        """每個 (item, period) 取出現次數最多的值；最多次的值不只一個時無法判斷，略過並記錄在conflicts"""
+        groups = {}
+        for fact in self.fact_store.query(report=report):
+            groups.setdefault((fact['item'], fact['period']), []).append(fact)
+
+        best = {}
+        for (item, period), facts in groups.items():
+            top = facts[0]['occurrences']
+            values = sorted({fact['value'] for fact in facts if fact['occurrences'] == top})
+            if len(values) > 1:
+                self.conflicts.append({'report': report, 'item': item, 'period': period, 'values': values})
+                continue
+            best[(item, period)] = facts[0]
+        return best
+
+    def _align_item(self, item, facts_a, facts_b):
+        periods_a = {period for fact_item, period in facts_a if fact_item == item}
+        periods_b = {period for fact_item, period in facts_b if fact_item == item}
+        if not periods_a or not periods_b:
+            return []
+
+        # 各自最新一期 (如A為112年報、B為113年報時即為2023 / 2024)，再列出共同期間的比較數
+        latest = (self._latest(periods_a), self._latest(periods_b))
+        pairs = [(latest, 'latest')]
+        for period in sorted((periods_a & periods_b) - {None}, reverse=True):
+            if (period, period) != latest:
+                pairs.append(((period, period), 'same_period'))
+
+        rows = []
+        for (period_a, period_b), basis in pairs:
+            fact_a = facts_a[(item, period_a)]
+            fact_b = facts_b[(item, period_b)]
+            rows.append({
+                'item': item,
+                'name': ITEM_NAMES.get(item, item),
+                'period_a': period_a,
+                'period_b': period_b,
+                'basis': basis,
+                'value_a': fact_a['value'],
+                'value_b': fact_b['value'],
+                'unit': fact_a['unit'] if fact_a['unit'] == fact_b['unit'] else None,
+                'page_a': fact_a['page'],
+                'page_b': fact_b['page']
+            })
+        return rows
+
+    def _latest(self, periods):
+        dated = sorted(period for period in periods if period is not None)
+        return dated[-1] if dated else None
+
+
+def format_diff_table(rows):
+    """將比較列格式化為markdown表格"""
+    lines = [
+        "| 項目 | 期間 | 報告A | 報告B | 差額 | 變動率 | B/A |",
+        "|---|---|---:|---:|---:|---:|---:|"
+    ]
+
+    for row in rows:
+        period = _period_label(row)
+        delta_pct = f"{row['delta_pct']:+.2f}%" if row['delta_pct'] is not None else '-'
+        ratio = f"{row['ratio']:.2f}" if row['ratio'] is not None else '-'
+        lines.append(
+            f"| {row['name']} | {period} | {_format_number(row['value_a'])} | {_format_number(row['value_b'])} | "
+            f"{_format_number(row['delta'], signed=True)} | {delta_pct} | {ratio} |"
+        )
+
+    return '\n'.join(lines)
+
+
+def _period_label(row):
+    if row['period_a'] == row['period_b']:
+        period = row['period_a'] or '-'
+    else:
+        period = f"{row['period_a'] or '-'} / {row['period_b'] or '-'}"
+    if row.get('basis') == 'latest':
+        period += ' (最新期)'
+    return period
+
+
+def _format_number(value, signed=False):
+    if float(value).is_integer():
+        return f"{value:+,.0f}" if signed else f"{value:,.0f}"
+    return f"{value:+,.2f}" if signed else f"{value:,.2f}"
+
+
+def summarize_diff(rows, limit=5):
+    """不經LLM的文字摘要: 依變動幅度列出主要項目"""
+    ranked = sorted(rows, key=lambda row: abs(row['delta_pct']) if row['delta_pct'] is not None else -1, reverse=True)
+
+    lines = []
+    for row in ranked[:limit]:
+        change = f"{row['delta_pct']:+.2f}%" if row['delta_pct'] is not None else "無法計算變動率"
+        lines.append(
+            f"{row['name']} [{_period_label(row)}]: 報告A {_format_number(row['value_a'])}，報告B {_format_number(row['value_b'])} ({change})"
+        )
+    return '\n'.join(lines)
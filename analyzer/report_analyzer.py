@@ -1,11 +1,25 @@
 import os
 import json
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from parser.report_store import records_path_for
+from parser.parse_cache import hash_file
+from .fact_store import FinancialFactStore
+from .numeric_diff import NumericDiffEngine, format_diff_table, summarize_diff
 
 class FinancialReportAnalyzer:
-    def __init__(self, pdf_parser, qa_engine):
+    def __init__(self, pdf_parser, qa_engine, fact_store=None, use_llm=True, llm_concurrency=4, retriever=None):
         self.pdf_parser = pdf_parser
         self.qa_engine = qa_engine
+        # 有retriever時以TF-IDF檢索各類別的相關片段，否則逐行比對關鍵字
+        self.retriever = retriever
+        self.section_chunk_size = 1500
+        self.fact_store = fact_store or FinancialFactStore()
+        self.diff_engine = NumericDiffEngine(self.fact_store)
+        self.use_llm = use_llm
+        # 同時送出的LLM請求數上限，應配合Ollama的OLLAMA_NUM_PARALLEL
+        self.llm_concurrency = max(1, llm_concurrency)
         
         self.analysis_framework = {
             "營收分析": ["營收", "收入", "營業收入", "銷售", "revenue", "sales"],
@@ -15,33 +29,59 @@ class FinancialReportAnalyzer:
             "投資分析": ["投資", "資本支出", "研發", "capex", "investment", "R&D"],
             "風險因子分析": ["風險", "不確定", "挑戰", "risk", "uncertainty", "challenge"]
         }
+        
+        # 各分析類別對應的財務數值項目 (事實表中的item)
+        self.category_items = {
+            "營收分析": ["revenue", "cost_of_revenue", "gross_profit"],
+            "獲利能力分析": ["gross_profit", "operating_income", "pre_tax_income", "net_income", "eps"],
+            "財務結構分析": ["total_assets", "current_assets", "total_liabilities", "current_liabilities", "total_equity"],
+            "現金流分析": ["cash", "operating_cash_flow", "investing_cash_flow", "dividends"],
+            "投資分析": ["capex", "rd_expense"],
+            "風險因子分析": []
+        }
     
-    def generate_comprehensive_report(self, report_a_path, report_b_path):
+    def generate_comprehensive_report(self, report_a_path, report_b_path, force_reparse=False):
         print("開始生成分析報告...")
         
         print("解析PDF檔案...")
-        text_a = self._parse_pdf_report(report_a_path, "report_a")
-        text_b = self._parse_pdf_report(report_b_path, "report_b")
-        
-        print(f"PDF解析完成 - 報告A: {len(text_a)} 字符")
-        print(f"PDF解析完成 - 報告B: {len(text_b)} 字符")
-        
-        analysis_a = {}
-        analysis_b = {}
-        
-        print("分析報告A...")
+        pages_a = self._parse_pdf_report(report_a_path, "report_a", force_reparse)
+        pages_b = self._parse_pdf_report(report_b_path, "report_b", force_reparse)
+        
+        print(f"PDF解析完成 - 報告A: {len(pages_a)} 頁, {sum(len(page['text']) for page in pages_a)} 字符")
+        print(f"PDF解析完成 - 報告B: {len(pages_b)} 頁, {sum(len(page['text']) for page in pages_b)} 字符")
+        
+        for report_name, pages in (("report_a", pages_a), ("report_b", pages_b)):
+            fact_count = self._load_facts(report_name, pages)
+            print(f"財務事實 - {report_name}: {fact_count} 筆")
+        
+        numeric_diffs = {}
+        if pages_a and pages_b:
+            numeric_diffs = self.diff_engine.compare("report_a", "report_b")
+            print(f"數值比較: {len(numeric_diffs)} 個共同項目")
+            if self.diff_engine.conflicts:
+                print(f"數值不一致而未比較: {len(self.diff_engine.conflicts)} 組 (項目, 期間)")
+        
+        sections_a = {}
+        sections_b = {}
+        if self.retriever is not None and pages_a and pages_b:
+            print("檢索各類別相關內容...")
+            sections_a, sections_b = self._retrieve_sections(pages_a, pages_b)
+        
+        print("擷取報告A相關內容...")
         for category, keywords in self.analysis_framework.items():
-            print(f"  分析{category}...")
-            content_sections = self.extract_relevant_content(text_a, keywords, category)
-            analysis_a[category] = self.analyze_category_from_content(category, content_sections, {})
+            if not sections_a.get(category):
+                print(f"  {category}...")
+                sections_a[category] = self.extract_relevant_content(None, keywords, category, pages_a)
         
-        print("分析報告B...")
+        print("擷取報告B相關內容...")
         for category, keywords in self.analysis_framework.items():
-            print(f"  分析{category}...")
-            content_sections = self.extract_relevant_content(text_b, keywords, category)
-            analysis_b[category] = self.analyze_category_from_content(category, content_sections, {})
+            if not sections_b.get(category):
+                print(f"  {category}...")
+                sections_b[category] = self.extract_relevant_content(None, keywords, category, pages_b)
+        
+        analysis_a, analysis_b, comparisons = self._run_analysis_graph(sections_a, sections_b, numeric_diffs)
         
-        report = self.generate_comparison_report(analysis_a, analysis_b)
+        report = self.generate_comparison_report(analysis_a, analysis_b, numeric_diffs, comparisons)
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_path = f"reports/financial_analysis_{timestamp}.md"
@@ -61,40 +101,117 @@ class FinancialReportAnalyzer:
         
         return report, output_path
     
-    def _parse_pdf_report(self, pdf_path, report_name):
-        output_path = f"outputs/{report_name}_agent.txt"
-        
-        if not os.path.exists(output_path):
-            self.pdf_parser.extract_text_from_pdf(pdf_path, output_path)
-        
-        with open(output_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+    def _run_analysis_graph(self, sections_a, sections_b, numeric_diffs):
+        """各類別的A/B分析同時送出，某類別兩份分析都完成後立即送出該類別的比較，結果依類別順序排列"""
+        categories = list(self.analysis_framework)
+        analyses = {'A': {}, 'B': {}}
+        comparisons = {}
+        
+        print(f"LLM分析 (同時 {self.llm_concurrency} 個請求)...")
+        with ThreadPoolExecutor(max_workers=self.llm_concurrency) as executor:
+            analysis_futures = {}
+            for report_id, sections in (('A', sections_a), ('B', sections_b)):
+                for category in categories:
+                    future = executor.submit(self.analyze_category_from_content, category, sections[category], {})
+                    analysis_futures[future] = (report_id, category)
+            
+            comparison_futures = {}
+            for future in as_completed(analysis_futures):
+                report_id, category = analysis_futures[future]
+                analyses[report_id][category] = future.result()
+                print(f"  報告{report_id} {category} 完成")
+                
+                if category in analyses['A'] and category in analyses['B']:
+                    comparison_futures[category] = executor.submit(
+                        self.compare_category,
+                        category,
+                        analyses['A'][category],
+                        analyses['B'][category],
+                        self._category_numeric_rows(category, numeric_diffs)
+                    )
+            
+            for category, future in comparison_futures.items():
+                comparisons[category] = future.result()
         
-        return content
+        analysis_a = {category: analyses['A'][category] for category in categories}
+        analysis_b = {category: analyses['B'][category] for category in categories}
+        comparisons = {category: comparisons[category] for category in categories}
+        return analysis_a, analysis_b, comparisons
     
-    def extract_relevant_content(self, full_content, keywords, category):
-        if not full_content:
+    def _category_numeric_rows(self, category, numeric_diffs):
+        return [
+            row for item in self.category_items.get(category, [])
+            for row in (numeric_diffs or {}).get(item, [])
+        ]
+    
+    def _parse_pdf_report(self, pdf_path, report_name, force_reparse=False):
+        """解析 (或讀取快取) 並回傳逐頁結構化紀錄，不讀回完整的報告文字"""
+        output_path = f"outputs/{report_name}_agent.txt"
+        return list(self.pdf_parser.iter_page_records_cached(pdf_path, output_path, force_reparse))
+    
+    def _load_facts(self, report_name, pages):
+        """將逐頁提取的財務數值寫入事實表，解析產物未變時沿用既有資料"""
+        records_path = records_path_for(f"outputs/{report_name}_agent.txt")
+        source = hash_file(records_path).hexdigest()
+        return self.fact_store.load_report(report_name, pages, source)
+    
+    def _retrieve_sections(self, pages_a, pages_b, max_sections=5):
+        """所有類別的查詢以search_many一次計算，每份報告各取最相關的片段；沒有結果的類別之後改用關鍵字比對"""
+        self.retriever.chunk_page_records(pages_a, pages_b, chunk_size=self.section_chunk_size)
+        self.retriever.build_index()
+        
+        categories = list(self.analysis_framework)
+        queries = [' '.join(self.analysis_framework[category]) for category in categories]
+        results = self.retriever.search_many(queries, top_k=max_sections, score_threshold=0.05, per_report=True)
+        
+        sections = {'A': {}, 'B': {}}
+        for category, hits in zip(categories, results):
+            keywords = self.analysis_framework[category]
+            for hit in hits:
+                text_lower = hit['text'].lower()
+                sections[hit['report_id']].setdefault(category, []).append({
+                    "page": hit['page'],
+                    "chunk_id": hit['chunk_id'],
+                    "keyword_found": [kw for kw in keywords if kw.lower() in text_lower],
+                    "content": hit['text']
+                })
+        
+        for report_id in ('A', 'B'):
+            found = sum(len(category_sections) for category_sections in sections[report_id].values())
+            print(f"  報告{report_id}: {found} 個相關片段")
+        return sections['A'], sections['B']
+    
+    def extract_relevant_content(self, full_content, keywords, category, pages=None):
+        if pages is not None:
+            # 逐頁搜尋，前後文不會跨頁混入其他頁的頁首
+            documents = [(record['page'], record['text']) for record in pages]
+        elif full_content:
+            documents = [(None, full_content)]
+        else:
             return []
         
         relevant_sections = []
-        lines = full_content.split('\n')
         
-        for i, line in enumerate(lines):
-            line_lower = line.lower()
+        for page, text in documents:
+            lines = text.split('\n')
             
-            if any(keyword.lower() in line_lower for keyword in keywords):
-                start_idx = max(0, i - 10)
-                end_idx = min(len(lines), i + 10)
-                
-                context_lines = lines[start_idx:end_idx]
-                context = '\n'.join(context_lines).strip()
+            for i, line in enumerate(lines):
+                line_lower = line.lower()
                 
-                if len(context) > 50: 
-                    relevant_sections.append({
-                        "line_number": i,
-                        "keyword_found": [kw for kw in keywords if kw.lower() in line_lower],
-                        "content": context[:3000]  
-                    })
+                if any(keyword.lower() in line_lower for keyword in keywords):
+                    start_idx = max(0, i - 10)
+                    end_idx = min(len(lines), i + 10)
+                    
+                    context_lines = lines[start_idx:end_idx]
+                    context = '\n'.join(context_lines).strip()
+                    
+                    if len(context) > 50: 
+                        relevant_sections.append({
+                            "page": page,
+                            "line_number": i,
+                            "keyword_found": [kw for kw in keywords if kw.lower() in line_lower],
+                            "content": context[:3000]  
+                        })
         
         unique_sections = []
         used_content = set()
@@ -108,12 +225,23 @@ class FinancialReportAnalyzer:
         print(f"    找到 {len(unique_sections)} 個相關片段")
         return unique_sections
     
+    def _section_page_label(self, section):
+        return f" 第{section['page']}頁" if section.get('page') else ""
+    
     def analyze_category_from_content(self, category, content_sections, config):
         if not content_sections:
             return {"status": "無內容可分析"}
         
+        if not self.use_llm:
+            return {
+                "status": "已擷取",
+                "sections_analyzed": len(content_sections),
+                "keywords_found": [kw for section in content_sections for kw in section['keyword_found']],
+                "data_quality": "良好" if len(content_sections) >= 2 else "有限"
+            }
+        
         combined_content = "\n\n".join([
-            f"片段 {i+1} (關鍵字: {section['keyword_found']}):\n{section['content']}" 
+            f"片段 {i+1}{self._section_page_label(section)} (關鍵字: {section['keyword_found']}):\n{section['content']}" 
             for i, section in enumerate(content_sections)
         ])
         
@@ -140,7 +268,7 @@ class FinancialReportAnalyzer:
             "data_quality": "良好" if len(content_sections) >= 2 else "有限"
         }
     
-    def generate_comparison_report(self, analysis_a, analysis_b):
+    def generate_comparison_report(self, analysis_a, analysis_b, numeric_diffs=None, comparisons=None):
         report = {
             "標題": "財報比較分析報告",
             "生成時間": datetime.now().strftime("%Y年%m月%d日 %H:%M"),
@@ -150,11 +278,14 @@ class FinancialReportAnalyzer:
         }
         
         for category in self.analysis_framework.keys():
-            if category in analysis_a and category in analysis_b:
+            if comparisons and category in comparisons:
+                report["詳細分析"][category] = comparisons[category]
+            elif category in analysis_a and category in analysis_b:
                 comparison = self.compare_category(
                     category, 
                     analysis_a[category], 
-                    analysis_b[category]
+                    analysis_b[category],
+                    self._category_numeric_rows(category, numeric_diffs)
                 )
                 report["詳細分析"][category] = comparison
         
@@ -163,7 +294,17 @@ class FinancialReportAnalyzer:
         
         return report
     
-    def compare_category(self, category, analysis_a, analysis_b):
+    def compare_category(self, category, analysis_a, analysis_b, numeric_rows=None):
+        if numeric_rows:
+            return self._compare_numeric(category, analysis_a, analysis_b, numeric_rows)
+        
+        if not self.use_llm:
+            return {
+                "比較結果": "無可比較的財務數值 (未使用LLM)",
+                "報告A狀態": analysis_a.get("status", "未知"),
+                "報告B狀態": analysis_b.get("status", "未知")
+            }
+        
         if analysis_a.get("status") != "已分析" or analysis_b.get("status") != "已分析":
             return {
                 "比較結果": f"資料不足，無法比較。報告A狀態: {analysis_a.get('status')}，報告B狀態: {analysis_b.get('status')}",
@@ -201,6 +342,41 @@ class FinancialReportAnalyzer:
             }
         }
     
+    def _compare_numeric(self, category, analysis_a, analysis_b, numeric_rows):
+        """差額與變動率已由程式計算，LLM只負責說明 (--no-llm時直接使用表格)"""
+        table = format_diff_table(numeric_rows)
+        
+        if self.use_llm:
+            prompt = f"""以下是兩份台積電財報{category}相關項目的數值比較表，差額、變動率與倍數均已計算完成：
+
+{table}
+
+請根據表格說明（請用繁體中文）：
+1. 主要數據差異
+2. 趨勢變化分析
+3. 優劣勢評估
+4. 關鍵發現
+
+請直接引用表格中的數字，不要重新計算。格式簡潔清楚。"""
+            
+            comparison_result = self.qa_engine.generate_answer(prompt, temperature=0.1)
+        else:
+            comparison_result = summarize_diff(numeric_rows)
+        
+        return {
+            "比較結果": comparison_result,
+            "數值比較": numeric_rows,
+            "數值比較表": table,
+            "資料品質": {
+                "報告A": analysis_a.get("data_quality", "未知"),
+                "報告B": analysis_b.get("data_quality", "未知")
+            },
+            "分析片段數": {
+                "報告A": analysis_a.get("sections_analyzed", 0),
+                "報告B": analysis_b.get("sections_analyzed", 0)
+            }
+        }
+    
     def generate_executive_summary(self, detailed_analysis):
         successful_analyses = {k: v for k, v in detailed_analysis.items() 
                              if "比較結果" in v and len(v["比較結果"]) > 50}
@@ -221,8 +397,9 @@ class FinancialReportAnalyzer:
         }
     
     def generate_overall_assessment(self, analysis_a, analysis_b):
-        successful_a = sum(1 for v in analysis_a.values() if v.get("status") == "已分析")
-        successful_b = sum(1 for v in analysis_b.values() if v.get("status") == "已分析")
+        analyzed_statuses = ("已分析", "已擷取")
+        successful_a = sum(1 for v in analysis_a.values() if v.get("status") in analyzed_statuses)
+        successful_b = sum(1 for v in analysis_b.values() if v.get("status") in analyzed_statuses)
         total_categories = len(self.analysis_framework)
         
         return {
@@ -235,7 +412,7 @@ class FinancialReportAnalyzer:
                 "關注關鍵指標的變化趨勢",
                 "評估投資決策的風險因子"
             ],
-            "分析方法": "AI智能語義分析"
+            "分析方法": "AI智能語義分析" if self.use_llm else "數值比較 (未使用LLM)"
         }
     
     def format_report_as_markdown(self, report):
@@ -258,6 +435,8 @@ class FinancialReportAnalyzer:
         for category, analysis in report['詳細分析'].items():
             md += f"### {category}\n\n"
             md += f"{analysis.get('比較結果', '無分析結果')}\n\n"
+            if analysis.get('數值比較表'):
+                md += f"{analysis['數值比較表']}\n\n"
         
         md += "## 綜合評估\n\n"
         
@@ -8,24 +8,67 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from parser.pdf_parser import PDFParser
 from utils.session_manager import SessionManager
 from semantic import SemanticRetriever
+from semantic.token_budget import TokenBudget
+from semantic.index_store import TfidfIndexStore
 from llm.qa_engine import QAEngine
 from analyzer.report_analyzer import FinancialReportAnalyzer
 
+# 對話模式的固定系統提示: 每輪請求都以相同的開頭送出，Ollama可重用已預填的KV cache
+CHAT_SYSTEM_PROMPT = """你是專業的財務分析助手。請基於提供的相關財報內容回答問題。
+
+回答要求：
+1. 使用繁體中文
+2. 基於提供的內容準確回答
+3. 引用具體數字支持回答
+4. 如果內容不足以回答問題，請明確說明
+5. 比較兩份報告時請明確標示報告來源"""
+
 class FinancialAnalysisSystem:
-    def __init__(self):
-        self.pdf_parser = PDFParser()
+    def __init__(self, workers=1, cache_dir="outputs/cache", cache_max_mb=2048, enhance_profile='auto',
+                 use_llm=True, llm_concurrency=4, ocr_quality_threshold=None):
+        self.pdf_parser = PDFParser(
+            workers=workers,
+            cache_dir=cache_dir,
+            cache_max_mb=cache_max_mb,
+            enhance_profile=enhance_profile,
+            ocr_quality_threshold=ocr_quality_threshold
+        )
         self.session_manager = SessionManager()
-        self.semantic_retriever = SemanticRetriever()
         self.qa_engine = QAEngine()
-        self.report_analyzer = FinancialReportAnalyzer(self.pdf_parser, self.qa_engine)
+        # 校正資料以模型名稱為鍵，第一次估算時才等待背景連線檢查決定實際使用的模型
+        self.token_budget = TokenBudget(
+            model_name=self._resolve_model_name,
+            num_ctx=self.qa_engine.num_ctx,
+            calibration_path=os.path.join(cache_dir, "token_calibration.json")
+        )
+        self.semantic_retriever = SemanticRetriever(
+            token_budget=self.token_budget,
+            index_store=TfidfIndexStore(os.path.join(cache_dir, "tfidf"))
+        )
+        self.report_analyzer = FinancialReportAnalyzer(
+            self.pdf_parser, self.qa_engine, use_llm=use_llm, llm_concurrency=llm_concurrency,
+            retriever=self.semantic_retriever
+        )
+        self.use_llm = use_llm
         
         self.reports_loaded = False
         self.current_session = None
         self.conversation_history = []
+        # 送往/api/chat的訊息，除了歷史佔用過多context時壓縮外只在尾端附加
+        self.chat_history_turns = 3
+        self.chat_answer_tokens = 2048
+        self.min_context_tokens = 2000
+        self.chat_messages = self._new_chat_messages()
+        # 上一次請求模型已處理的訊息 (含其回答)，開頭相同的部分在KV cache中不會重新預填
+        self._prefilled_messages = []
         
         print("財報比較分析系統")
     
-    def run_analysis_mode(self, report_a_path=None, report_b_path=None):
+    def _resolve_model_name(self):
+        self.qa_engine.wait_until_ready()
+        return self.qa_engine.model_name
+    
+    def run_analysis_mode(self, report_a_path=None, report_b_path=None, force_reparse=False):
         if not report_a_path:
             report_a_path = "data/report_a.pdf"
         if not report_b_path:
@@ -34,12 +77,18 @@ class FinancialAnalysisSystem:
         print("\n智能財報分析模式")
         
         report, report_path = self.report_analyzer.generate_comprehensive_report(
-            report_a_path, report_b_path
+            report_a_path, report_b_path, force_reparse
         )
         
         print(f"\n分析完成")
         print(f"報告路徑: {report_path}")
         
+        cache_stats = self.qa_engine.get_cache_stats()
+        if cache_stats['hits'] or cache_stats['misses']:
+            avg_hit_ms = cache_stats['hit_seconds'] / max(cache_stats['hits'], 1) * 1000
+            print(f"LLM回應快取: 命中 {cache_stats['hits']} 次 (平均 {avg_hit_ms:.1f}ms), "
+                  f"未命中 {cache_stats['misses']} 次, 略過 {cache_stats['bypassed']} 次")
+        
         self.display_report_summary(report)
         return True
     
@@ -63,19 +112,14 @@ class FinancialAnalysisSystem:
         report_a_output = "outputs/report_a_agent.txt"
         report_b_output = "outputs/report_b_agent.txt"
         
-        if force_reparse or not os.path.exists(report_a_output) or not os.path.exists(report_b_output):
-            print("解析PDF中...")
-            self.pdf_parser.extract_text_from_pdf(report_a_path, report_a_output)
-            self.pdf_parser.extract_text_from_pdf(report_b_path, report_b_output)
-        
-        with open(report_a_output, 'r', encoding='utf-8') as f:
-            report_a_text = f.read()
-        with open(report_b_output, 'r', encoding='utf-8') as f:
-            report_b_text = f.read()
+        print("解析PDF中...")
+        # 每頁解析完成 (或從快取讀出) 即切塊，不必等整份報告解析完，也不讀回完整的報告文字
+        report_a_pages = self.pdf_parser.iter_page_records_cached(report_a_path, report_a_output, force_reparse)
+        report_b_pages = self.pdf_parser.iter_page_records_cached(report_b_path, report_b_output, force_reparse)
+        self.semantic_retriever.chunk_page_records(report_a_pages, report_b_pages)
         
         print("建立TF-IDF索引...")
-        self.semantic_retriever.chunk_documents(report_a_text, report_b_text)
-        self.semantic_retriever.build_index()
+        self.semantic_retriever.build_index(force_rebuild=force_reparse)
         
         self.reports_loaded = True
         print("PDF解析完成")
@@ -97,9 +141,8 @@ class FinancialAnalysisSystem:
                 self._clear_conversation()
             elif question:
                 print("思考中...")
-                answer = self._get_answer(question)
+                answer = self._stream_answer(question)
                 if answer:
-                    print(f"\n{answer}")
                     self.conversation_history.append({
                         "user": question,
                         "assistant": answer
@@ -107,40 +150,78 @@ class FinancialAnalysisSystem:
                 else:
                     print("無法生成回答")
     
-    def _get_answer(self, question):
-        relevant_context, selected_chunks = self.semantic_retriever.smart_context_selection(question)
+    def _stream_answer(self, question):
+        """逐段印出模型輸出，結束後才套用回答品質檢查"""
+        self._compact_chat_messages(question)
         
+        # 檢索內容的token上限: num_ctx扣除歷史訊息、問題與預留給回答的token
+        context_tokens = self.token_budget.available(
+            self.chat_messages + [self._chat_user_message("", question)], self.chat_answer_tokens
+        )
+        relevant_context, selected_chunks = self.semantic_retriever.smart_context_selection(
+            question, max_tokens=context_tokens
+        )
         if not relevant_context:
-            return "未找到相關內容，請重新表述問題"
+            answer = "未找到相關內容，請重新表述問題"
+            print(f"\n{answer}")
+            return answer
         
-        system_prompt = """你是專業的財務分析助手。請基於提供的相關財報內容回答問題。
-
-回答要求：
-1. 使用繁體中文
-2. 基於提供的內容準確回答
-3. 引用具體數字支持回答
-4. 如果內容不足以回答問題，請明確說明
-5. 比較兩份報告時請明確標示報告來源"""
-
-        conversation_context = ""
-        if self.conversation_history:
-            recent_history = self.conversation_history[-3:]
-            for i, conv in enumerate(recent_history, 1):
-                conversation_context += f"\n對話{i}:\n問: {conv['user']}\n答: {conv['assistant'][:100]}...\n"
-
-        prompt = f"""{system_prompt}
-
-相關財報內容:
-{relevant_context}
-
-對話歷史:
-{conversation_context}
-
-問題: {question}
-
-請基於以上內容用繁體中文詳細回答。"""
-
-        return self.qa_engine.generate_answer(prompt)
+        # 檢索內容放在最後一則使用者訊息，前面的系統提示與歷史訊息維持不變
+        user_message = self._chat_user_message(relevant_context, question)
+        messages = self.chat_messages + [user_message]
+        
+        print()
+        pieces = []
+        for token in self.qa_engine.stream_chat(messages, max_tokens=self.chat_answer_tokens):
+            print(token, end='', flush=True)
+            pieces.append(token)
+        print()
+        
+        raw_answer = ''.join(pieces).strip()
+        answer = self.qa_engine.process_answer(raw_answer)
+        if answer != raw_answer:
+            print(f"\n{answer}")
+        
+        stream_stats = self.qa_engine.stream_stats
+        if stream_stats['last_ttft'] is not None:
+            # 保留模型實際的輸出，下一輪請求的開頭才會與這一輪完全相同
+            self.chat_messages += [user_message, {"role": "assistant", "content": raw_answer}]
+            
+            prefill = stream_stats['last_prompt_eval_count']
+            self.token_budget.observe(messages, prefill, self._cached_message_count(messages))
+            self._prefilled_messages = list(self.chat_messages)
+            prefill_info = f", 預填 {prefill} tokens" if prefill is not None else ""
+            print(f"(首個token {stream_stats['last_ttft']:.1f}秒, 共 {stream_stats['last_total']:.1f}秒{prefill_info})")
+        
+        return answer
+    
+    def _cached_message_count(self, messages):
+        """與上一次請求開頭相同的訊息數 (壓縮或載入會話後開頭改變，需重新預填)"""
+        count = 0
+        for message, prefilled in zip(messages, self._prefilled_messages):
+            if message != prefilled:
+                break
+            count += 1
+        return count
+    
+    def _chat_user_message(self, context, question):
+        return {
+            "role": "user",
+            "content": f"相關財報內容:\n{context}\n\n問題: {question}\n\n請基於以上內容用繁體中文詳細回答。"
+        }
+    
+    def _new_chat_messages(self, history=()):
+        messages = [{"role": "system", "content": CHAT_SYSTEM_PROMPT}]
+        for conv in history:
+            messages.append({"role": "user", "content": conv['user']})
+            messages.append({"role": "assistant", "content": conv['assistant']})
+        return messages
+    
+    def _compact_chat_messages(self, question):
+        """歷史訊息使檢索內容可用的token少於下限時，改為只保留最近幾輪的問答 (不含檢索內容)，之後繼續在尾端附加"""
+        messages = self.chat_messages + [self._chat_user_message("", question)]
+        if self.token_budget.available(messages, self.chat_answer_tokens) < self.min_context_tokens:
+            self.chat_messages = self._new_chat_messages(self.conversation_history[-self.chat_history_turns:])
     
     def _save_conversation(self):
         if not self.conversation_history:
@@ -153,6 +234,7 @@ class FinancialAnalysisSystem:
         
         data = {
             "conversation_history": self.conversation_history,
+            "chat_messages": self.chat_messages,
             "summary": {"total_conversations": len(self.conversation_history)}
         }
         
@@ -186,6 +268,11 @@ class FinancialAnalysisSystem:
             
             if data:
                 self.conversation_history = data.get('conversation_history', [])
+                # 沿用儲存時的訊息可讓開頭與先前的請求一致；系統提示已變更時依歷史重建
+                chat_messages = data.get('chat_messages')
+                if not chat_messages or chat_messages[0] != self._new_chat_messages()[0]:
+                    chat_messages = self._new_chat_messages(self.conversation_history[-self.chat_history_turns:])
+                self.chat_messages = chat_messages
                 self.current_session = session['session_name']
                 print(f"載入: {session['session_name']}")
             else:
@@ -196,6 +283,7 @@ class FinancialAnalysisSystem:
     def _clear_conversation(self):
         if input("確定清除對話？(y/N): ").strip().lower() in ['y', 'yes']:
             self.conversation_history = []
+            self.chat_messages = self._new_chat_messages()
             self.current_session = None
             print("已清除")
         else:
@@ -230,18 +318,36 @@ def main():
     parser.add_argument("--report-b", help="財報B路徑")
     parser.add_argument("--mode", choices=['analysis', 'chat'], default='analysis')
     parser.add_argument("--force-reparse", action="store_true", help="強制重新解析")
+    parser.add_argument("--workers", type=int, default=1, help="PDF解析平行worker數 (0 = 依CPU核心數)")
+    parser.add_argument("--cache-dir", default="outputs/cache", help="解析快取目錄")
+    parser.add_argument("--cache-max-mb", type=int, default=2048, help="解析快取容量上限 (MB，整份報告與單頁快取合計)")
+    parser.add_argument("--enhance-profile", choices=['auto', 'fast', 'quality'], default='auto',
+                        help="OCR影像增強流程 (auto = 依雜訊估計選擇)")
+    parser.add_argument("--llm-concurrency", type=int, default=4,
+                        help="分析模式同時送出的LLM請求數 (應配合OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--no-llm", action="store_true", help="分析模式只輸出數值比較，不呼叫LLM")
+    parser.add_argument("--ocr-quality-threshold", type=float, default=None,
+                        help="OCR平均信心度 (0~1) 達門檻即不執行其餘設定，需要tesserocr")
     
     args = parser.parse_args()
     
-    system = FinancialAnalysisSystem()
+    system = FinancialAnalysisSystem(
+        workers=args.workers,
+        cache_dir=args.cache_dir,
+        cache_max_mb=args.cache_max_mb,
+        enhance_profile=args.enhance_profile,
+        use_llm=not args.no_llm,
+        llm_concurrency=args.llm_concurrency,
+        ocr_quality_threshold=args.ocr_quality_threshold
+    )
     
     if args.mode == 'analysis':
-        success = system.run_analysis_mode(args.report_a, args.report_b)
+        success = system.run_analysis_mode(args.report_a, args.report_b, args.force_reparse)
         
-        if success:
+        if success and system.use_llm:
             choice = input("\n是否進入問答模式進行額外查詢？(y/N): ").strip().lower()
             if choice in ['y', 'yes']:
-                system.run_chat_mode(args.report_a, args.report_b, args.force_reparse)
+                system.run_chat_mode(args.report_a, args.report_b)
     
     elif args.mode == 'chat':
         system.run_chat_mode(args.report_a, args.report_b, args.force_reparse)
@@ -0,0 +1,103 @@
+import asyncio
+from typing import Optional, List
+
+from .qa_engine import QAEngine
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+
+class AsyncQAEngine:
+    """QAEngine的asyncio版本: 以httpx非同步連線池在少數連線上多工送出請求，未安裝httpx時改在執行緒中呼叫同步版本
+
+    使用asyncio.to_thread，需要Python 3.9+。
+    """
+
+    def __init__(self, qa_engine: Optional[QAEngine] = None, max_connections: int = 4, **engine_kwargs):
+        self.qa_engine = qa_engine or QAEngine(**engine_kwargs)
+        self.max_connections = max_connections
+        # Python 3.9的Semaphore在建立時綁定event loop，改在執行中的loop內建立
+        self._semaphore = None
+        self._semaphore_loop = None
+        self._client = None
+
+        if HTTPX_AVAILABLE:
+            self._client = httpx.AsyncClient(
+                timeout=self.qa_engine.timeout,
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+            )
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def generate_answer(self, prompt: str, temperature: float = 0.3, max_tokens: int = 2048,
+                              use_cache: bool = True) -> Optional[str]:
+        engine = self.qa_engine
+
+        if self._client is None:
+            async with self._get_semaphore():
+                return await asyncio.to_thread(engine.generate_answer, prompt, temperature, max_tokens, use_cache)
+
+        await asyncio.to_thread(engine.wait_until_ready)
+        options = engine._generation_options(temperature, max_tokens)
+        cache_key, cached_answer = await asyncio.to_thread(engine._lookup_cache, prompt, options, use_cache)
+        if cached_answer is not None:
+            return engine._process_answer(cached_answer)
+
+        payload = {
+            "model": engine.model_name,
+            "prompt": prompt,
+            "stream": False,
+            "options": options
+        }
+
+        for attempt in range(engine.max_retries):
+            try:
+                # 與執行緒路徑相同，同時進行的請求不超過max_connections
+                async with self._get_semaphore():
+                    response = await self._client.post(engine.generate_url, json=payload)
+
+                if response.status_code == 200:
+                    answer = response.json().get('response', '').strip()
+                    if answer:
+                        if cache_key:
+                            await asyncio.to_thread(engine.response_cache.put, cache_key, engine.model_name, answer)
+                        return engine._process_answer(answer)
+                    if attempt == 0:
+                        print("模型回傳空回答")
+                elif attempt == 0:
+                    print(f"API請求失敗: {response.status_code}")
+
+            except httpx.HTTPError as e:
+                if attempt == 0:
+                    print(f"請求失敗: {str(e)}")
+                if attempt < engine.max_retries - 1:
+                    await asyncio.sleep(2 ** attempt)
+
+            except ValueError as e:
+                # 回應內容不是有效的JSON，與同步版本相同回傳預設回答
+                print(f"未預期錯誤: {str(e)}")
+                break
+
+        return engine._get_fallback_answer()
+
+    async def generate_many(self, prompts: List[str], **kwargs) -> List[Optional[str]]:
+        """同時送出多個prompt，回傳順序與輸入相同"""
+        return await asyncio.gather(*(self.generate_answer(prompt, **kwargs) for prompt in prompts))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
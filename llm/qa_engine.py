@@ -1,41 +1,85 @@
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import logging
 import time
-from typing import Optional, Dict, Any
+import threading
+from typing import Optional, Dict, Any, Iterator
+
+from .response_cache import ResponseCache
 
 class QAEngine:
     def __init__(self, 
                  model_name="llama3:latest",
                  ollama_url="http://localhost:11434",
                  timeout=120,
-                 max_retries=3):
+                 max_retries=3,
+                 cache_path="outputs/cache/llm_responses.db",
+                 cache_max_mb=256,
+                 cache_ttl_hours=168,
+                 cache_max_temperature=0.1,
+                 pool_size=8,
+                 keep_alive="30m",
+                 num_ctx=8192):
         self.model_name = model_name
+        self.model_digest = None
         self.ollama_url = ollama_url
         self.timeout = timeout
         self.max_retries = max_retries
+        # 請求之間保留模型 (與其KV cache) 在記憶體中的時間
+        self.keep_alive = keep_alive
+        # 明確指定context長度，避免使用Ollama較小的預設值而截斷prompt；各請求相同才不會重新載入模型
+        self.num_ctx = num_ctx
+        
+        # 回應快取: 只快取低temperature (分析使用的0.1) 的輸出；預設0.3的取樣輸出不具重現性，不使用快取
+        self.response_cache = None
+        if cache_path:
+            self.response_cache = ResponseCache(cache_path, cache_max_mb * 1024 ** 2, cache_ttl_hours * 3600)
+        self.cache_max_temperature = cache_max_temperature
+        self.cache_stats = {'hits': 0, 'misses': 0, 'bypassed': 0, 'hit_seconds': 0.0}
+        self._stats_lock = threading.Lock()
+        # 串流回答的延遲統計 (首個token時間為使用者實際感受的等待)
+        self.stream_stats = {
+            'streams': 0, 'ttft_seconds': 0.0, 'last_ttft': None, 'last_total': None, 'last_prompt_eval_count': None
+        }
         
         self.generate_url = f"{ollama_url}/api/generate"
         self.chat_url = f"{ollama_url}/api/chat"
         
+        # 常駐連線池: 各請求重用keep-alive連線，pool_size為可同時使用的連線數
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        
         logging.getLogger(__name__).setLevel(logging.WARNING)
         
-        self._check_ollama_connection()
+        # 連線檢查在背景執行，不阻塞啟動；第一次送出請求前才等待結果
+        self._connection_check = threading.Thread(target=self._check_ollama_connection, daemon=True)
+        self._connection_check.start()
+    
+    def wait_until_ready(self):
+        """等待背景連線檢查完成 (模型名稱與digest在檢查時決定)"""
+        self._connection_check.join()
     
     def _check_ollama_connection(self):
         try:
-            response = requests.get(f"{self.ollama_url}/api/tags", timeout=5)
+            response = self.session.get(f"{self.ollama_url}/api/tags", timeout=5)
             if response.status_code == 200:
                 models = response.json().get('models', [])
                 model_names = [model['name'] for model in models]
+                # 模型digest納入快取鍵，重新pull模型後舊回應不再命中
+                model_digests = {model['name']: model.get('digest') for model in models}
                 
                 if self.model_name in model_names:
+                    self.model_digest = model_digests[self.model_name]
                     return
                 
                 llama3_models = [name for name in model_names if 'llama3' in name.lower()]
                 
                 if llama3_models:
                     self.model_name = llama3_models[0]
+                    self.model_digest = model_digests[self.model_name]
                     print(f"使用模型: {self.model_name}")
                     return
                 
@@ -50,22 +94,24 @@ class QAEngine:
             print(f"無法連接Ollama ({self.ollama_url})")
             print("確認服務已啟動: ollama serve")
     
-    def generate_answer(self, prompt: str, temperature: float = 0.3, max_tokens: int = 2048) -> Optional[str]:
+    def generate_answer(self, prompt: str, temperature: float = 0.3, max_tokens: int = 2048,
+                        use_cache: bool = True) -> Optional[str]:
+        self.wait_until_ready()
+        options = self._generation_options(temperature, max_tokens)
+        cache_key, cached_answer = self._lookup_cache(prompt, options, use_cache)
+        if cached_answer is not None:
+            return self._process_answer(cached_answer)
+        
         for attempt in range(self.max_retries):
             try:
                 payload = {
                     "model": self.model_name,
                     "prompt": prompt,
                     "stream": False,
-                    "options": {
-                        "temperature": temperature,
-                        "num_predict": max_tokens,
-                        "top_p": 0.9,
-                        "repeat_penalty": 1.1
-                    }
+                    "options": options
                 }
                 
-                response = requests.post(
+                response = self.session.post(
                     self.generate_url,
                     json=payload,
                     timeout=self.timeout,
@@ -77,6 +123,8 @@ class QAEngine:
                     answer = result.get('response', '').strip()
                     
                     if answer:
+                        if cache_key:
+                            self.response_cache.put(cache_key, self.model_name, answer)
                         processed_answer = self._process_answer(answer)
                         return processed_answer
                     else:
@@ -105,6 +153,174 @@ class QAEngine:
         
         return self._get_fallback_answer()
     
+    def stream_answer(self, prompt: str, temperature: float = 0.3, max_tokens: int = 2048,
+                      use_cache: bool = True) -> Iterator[str]:
+        """以Ollama串流API逐段產生回答，完整回答需再經process_answer檢查"""
+        self.wait_until_ready()
+        start_time = time.time()
+        with self._stats_lock:
+            self.stream_stats['last_ttft'] = None
+        
+        options = self._generation_options(temperature, max_tokens)
+        cache_key, cached_answer = self._lookup_cache(prompt, options, use_cache)
+        if cached_answer is not None:
+            self._record_stream(time.time() - start_time, time.time() - start_time)
+            yield cached_answer
+            return
+        
+        payload = {
+            "model": self.model_name,
+            "prompt": prompt,
+            "stream": True,
+            "options": options,
+            "keep_alive": self.keep_alive
+        }
+        
+        pieces = []
+        for token in self._stream_request(self.generate_url, payload, lambda chunk: chunk.get('response', ''), start_time):
+            pieces.append(token)
+            yield token
+        
+        answer = ''.join(pieces).strip()
+        if not answer:
+            yield self._get_fallback_answer()
+        elif cache_key:
+            self.response_cache.put(cache_key, self.model_name, answer)
+    
+    def stream_chat(self, messages: list, temperature: float = 0.3, max_tokens: int = 2048) -> Iterator[str]:
+        """以/api/chat串流回答多輪對話；messages開頭不變時Ollama可重用前一輪的KV cache，只需預填新增的內容"""
+        self.wait_until_ready()
+        start_time = time.time()
+        with self._stats_lock:
+            self.stream_stats['last_ttft'] = None
+        
+        payload = {
+            "model": self.model_name,
+            "messages": messages,
+            "stream": True,
+            "options": self._generation_options(temperature, max_tokens),
+            "keep_alive": self.keep_alive
+        }
+        
+        produced = False
+        for token in self._stream_request(
+            self.chat_url, payload, lambda chunk: chunk.get('message', {}).get('content', ''), start_time
+        ):
+            produced = True
+            yield token
+        
+        if not produced:
+            yield self._get_fallback_answer()
+    
+    def _stream_request(self, url: str, payload: Dict[str, Any], token_of, start_time: float) -> Iterator[str]:
+        """送出串流請求並逐段產生內容，完成時記錄首個token時間與prompt預填token數"""
+        produced = False
+        first_token_time = None
+        prompt_eval_count = None
+        
+        for attempt in range(self.max_retries):
+            try:
+                with self.session.post(
+                    url,
+                    json=payload,
+                    timeout=self.timeout,
+                    headers={"Content-Type": "application/json"},
+                    stream=True
+                ) as response:
+                    if response.status_code != 200:
+                        if attempt == 0:
+                            print(f"API請求失敗: {response.status_code}")
+                        if attempt < self.max_retries - 1:
+                            time.sleep(2 ** attempt)
+                        continue
+                    
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        try:
+                            chunk = json.loads(line)
+                        except json.JSONDecodeError:
+                            # 無法解析的行 (如代理插入的內容) 略過，不中斷串流
+                            print(f"略過無法解析的串流內容: {line[:80]!r}")
+                            continue
+                        token = token_of(chunk)
+                        if token:
+                            if first_token_time is None:
+                                first_token_time = time.time()
+                            produced = True
+                            yield token
+                        if chunk.get('done'):
+                            prompt_eval_count = chunk.get('prompt_eval_count')
+                            break
+                break
+            
+            except requests.exceptions.RequestException as e:
+                # 已輸出部分內容時不重試，避免重複輸出
+                if produced:
+                    print(f"\n串流中斷: {str(e)}")
+                    break
+                if attempt == 0:
+                    print(f"請求失敗: {str(e)}")
+                if attempt < self.max_retries - 1:
+                    time.sleep(2 ** attempt)
+        
+        if produced:
+            self._record_stream(first_token_time - start_time, time.time() - start_time, prompt_eval_count)
+    
+    def process_answer(self, answer: str) -> str:
+        """串流結束後對完整回答套用品質檢查"""
+        if answer == self._get_fallback_answer():
+            return answer
+        return self._process_answer(answer)
+    
+    def _record_stream(self, ttft: float, total: float, prompt_eval_count: Optional[int] = None):
+        with self._stats_lock:
+            self.stream_stats['streams'] += 1
+            self.stream_stats['ttft_seconds'] += ttft
+            self.stream_stats['last_ttft'] = ttft
+            self.stream_stats['last_total'] = total
+            self.stream_stats['last_prompt_eval_count'] = prompt_eval_count
+    
+    def _generation_options(self, temperature: float, max_tokens: int) -> Dict[str, Any]:
+        return {
+            "temperature": temperature,
+            "num_predict": max_tokens,
+            "num_ctx": self.num_ctx,
+            "top_p": 0.9,
+            "repeat_penalty": 1.1
+        }
+    
+    def _cache_key(self, prompt: str, options: Dict[str, Any]) -> Optional[str]:
+        """可快取時回傳快取鍵，未啟用快取或temperature過高時回傳None"""
+        if self.response_cache is None or options["temperature"] > self.cache_max_temperature:
+            return None
+        return self.response_cache.make_key(self.model_name, self.model_digest, prompt, options)
+    
+    def _lookup_cache(self, prompt: str, options: Dict[str, Any], use_cache: bool = True):
+        """回傳 (cache_key, 快取的原始回答)，不可快取時cache_key為None"""
+        cache_key = self._cache_key(prompt, options) if use_cache else None
+        if cache_key is None:
+            self._record_cache('bypassed')
+            return None, None
+        
+        start_time = time.time()
+        cached_answer = self.response_cache.get(cache_key)
+        if cached_answer is not None:
+            self._record_cache('hits', time.time() - start_time)
+        else:
+            self._record_cache('misses')
+        return cache_key, cached_answer
+    
+    def _record_cache(self, field: str, seconds: float = 0.0):
+        with self._stats_lock:
+            self.cache_stats[field] += 1
+            if field == 'hits':
+                self.cache_stats['hit_seconds'] += seconds
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return dict(self.cache_stats)
+    
     def _process_answer(self, answer: str) -> str:
         answer = answer.strip()
         
@@ -144,6 +360,7 @@ class QAEngine:
         return "目前無法連接到語言模型服務。請檢查Ollama服務是否正常運行。"
     
     def chat_with_context(self, messages: list, temperature: float = 0.3) -> Optional[str]:
+        self.wait_until_ready()
         try:
             payload = {
                 "model": self.model_name,
@@ -153,10 +370,11 @@ class QAEngine:
                     "temperature": temperature,
                     "top_p": 0.9,
                     "repeat_penalty": 1.1
-                }
+                },
+                "keep_alive": self.keep_alive
             }
             
-            response = requests.post(
+            response = self.session.post(
                 self.chat_url,
                 json=payload,
                 timeout=self.timeout,
@@ -174,8 +392,9 @@ class QAEngine:
             return None
     
     def get_model_info(self) -> Dict[str, Any]:
+        self.wait_until_ready()
         try:
-            response = requests.get(f"{self.ollama_url}/api/tags", timeout=5)
+            response = self.session.get(f"{self.ollama_url}/api/tags", timeout=5)
             if response.status_code == 200:
                 models = response.json().get('models', [])
                 current_model = next((m for m in models if m['name'] == self.model_name), None)
@@ -0,0 +1,241 @@
+import re
+import time
+from collections import defaultdict
+
+# 項目 -> 標籤 (中英文)，新增項目只需在此擴充
+FINANCIAL_ITEMS = {
+    'revenue': ['營業收入淨額', '營業收入合計', '淨營業收入', '營業收入', 'net revenue', 'revenue'],
+    'cost_of_revenue': ['營業成本合計', '營業成本', 'cost of revenue'],
+    'gross_profit': ['營業毛利淨額', '營業毛利', '毛利', 'gross profit'],
+    'operating_expenses': ['營業費用合計', '營業費用', 'operating expenses'],
+    'rd_expense': ['研究發展費用', 'research and development expenses'],
+    'operating_income': ['營業淨利', '營業利益', 'operating income'],
+    'pre_tax_income': ['稅前淨利', '稅前利益', 'income before income tax', 'income before tax'],
+    'income_tax': ['所得稅費用', 'income tax expense'],
+    'net_income': ['本期淨利', '淨利潤', '淨利', 'net income'],
+    'eps': ['基本每股盈餘', '稀釋每股盈餘', '每股盈餘', 'earnings per share', 'EPS'],
+    'total_assets': ['資產總額', '資產總計', '總資產', 'total assets'],
+    'current_assets': ['流動資產合計', 'total current assets'],
+    'total_liabilities': ['負債總額', '負債總計', '總負債', 'total liabilities'],
+    'current_liabilities': ['流動負債合計', 'total current liabilities'],
+    'total_equity': ['權益總額', '權益總計', 'total equity'],
+    'cash': ['現金及約當現金', 'cash and cash equivalents'],
+    'operating_cash_flow': ['營業活動之淨現金流入', '營業活動之淨現金流量', 'net cash generated by operating activities'],
+    'investing_cash_flow': ['投資活動之淨現金流出', '投資活動之淨現金流量', 'net cash used in investing activities'],
+    'capex': ['取得不動產、廠房及設備', 'acquisition of property, plant and equipment'],
+    'dividends': ['發放現金股利', 'cash dividends paid'],
+}
+
+# 提取規則變更時遞增，使快取的解析結果重新提取
+EXTRACTOR_VERSION = 2
+
+# 每股數值不受報表金額單位影響
+UNSCALED_ITEMS = {'eps'}
+
+UNIT_SCALES = {
+    '元': 1,
+    '仟元': 1e3,
+    '千元': 1e3,
+    '萬元': 1e4,
+    '百萬元': 1e6,
+    '億元': 1e8,
+    'thousands': 1e3,
+    'millions': 1e6,
+}
+
+_NUMBER = r'\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?'
+_VALUE = rf'\(\s*(?:{_NUMBER})\s*\)|[-−]?\s*(?:{_NUMBER})'
+_UNIT = '|'.join(sorted((unit for unit in UNIT_SCALES if not unit.isascii()), key=len, reverse=True))
+# 數值後直接標示的單位 (中英文)，優先於頁面單位
+_INLINE_UNIT = '|'.join(
+    rf'{unit}\b' if unit.isascii() else unit
+    for unit in sorted(UNIT_SCALES, key=len, reverse=True)
+)
+
+# 金額後接百分比欄 (如損益表的「金額 %」) 時，該欄是占營收比例而非另一期金額
+_PERCENT_HEADER = re.compile(r'(?:金\s*額|amount)\s*[%％]')
+_PAGE_UNIT_PATTERN = re.compile(
+    rf'單位\s*[：:]\s*(?:新[台臺]幣|人民幣|美元)?\s*({_UNIT})|in\s+(thousands|millions)'
+)
+# 數字密集的頁面上逐位置嘗試代價高，年度與季度 (英文) 分開掃描，季度只在含q時才掃
+_YEAR_PATTERN = re.compile(r'(\d{2,4})\s*年\s*(?:度|第\s*([一二三四1-4])\s*季)?')
+_QUARTER_PATTERN = re.compile(r'\b(?:fy\s*)?(20\d{2})\s*q([1-4])\b|\bq([1-4])\s*(20\d{2})\b')
+_VALUE_PATTERN = re.compile(_VALUE)
+_VALUE_CLEAN = re.compile(r'[\s,()\-−]')
+_WHITESPACE = re.compile(r'\s+')
+_QUARTERS = {'一': '1', '二': '2', '三': '3', '四': '4'}
+
+
+def _trie_alternation(labels):
+    """將標籤依共同字首組成巢狀正規式，每個位置只需沿一條分支比對"""
+    root = {}
+    for label in labels:
+        node = root
+        for char in label:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [
+            (r'\s+' if char == ' ' else re.escape(char)) + build(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # 貪婪的可選分支: 較長的標籤優先，避免「本期淨利」只匹配到「淨利」
+        return f'(?:{body})?' if '' in node else body
+
+    return build(root)
+
+
+def _build_label_pattern(items):
+    label_to_item = {}
+    for item, labels in items.items():
+        for label in labels:
+            label_to_item.setdefault(label.lower(), item)
+
+    # 英文標籤需為完整單字，避免 'eps' 匹配到 'steps'
+    ascii_labels = [label for label in label_to_item if label.isascii()]
+    other_labels = [label for label in label_to_item if not label.isascii()]
+    labels = _trie_alternation(other_labels)
+    if ascii_labels:
+        labels = rf'(?<![a-z0-9]){_trie_alternation(ascii_labels)}(?![a-z0-9])|{labels}'
+
+    # 不使用re.IGNORECASE (會停用字首快速比對)，改為比對前將內容轉小寫
+    pattern = re.compile(
+        rf'(?P<label>{labels})'
+        r'(?:\s*[（(]\s*附註[^)）]*[)）])?'
+        r'[：:\s]*(?:nt\$|us\$|\$)?\s*'
+        # 每期金額前可能各有貨幣符號；最多三期的金額與百分比欄
+        rf'(?P<values>(?:{_VALUE})(?:[ \t]+(?:(?:nt\$|us\$|\$)[ \t]*)?(?:{_VALUE})){{0,5}})'
+        rf'(?:\s*(?P<unit>{_INLINE_UNIT}))?'
+    )
+    return pattern, label_to_item
+
+
+def parse_value(text):
+    """解析單一數值，括號或負號表示負數"""
+    value = float(_VALUE_CLEAN.sub('', text))
+    return -value if text[0] in '(-−' else value
+
+
+def normalize_year_period(match):
+    """將 '112年度' / '2023年第三季' 統一為西元年 (如 '2023' 或 '2023Q3')"""
+    year, quarter = match.groups()
+    year = int(year)
+
+    if 80 <= year <= 150:
+        year += 1911  # 民國年
+    elif not 1900 <= year <= 2100:
+        return None
+
+    quarter = _QUARTERS.get(quarter, quarter)
+    return f"{year}Q{quarter}" if quarter else str(year)
+
+
+class FinancialValueExtractor:
+    """預先編譯的財務數值提取器: 所有項目標籤合併為單一正規式，每頁只掃描一次"""
+
+    def __init__(self, items=None):
+        self.items = items or FINANCIAL_ITEMS
+        self.pattern, self.label_to_item = _build_label_pattern(self.items)
+        self.stats = self.new_stats()
+
+    @staticmethod
+    def new_stats():
+        return {'pages': 0, 'facts': 0, 'seconds': 0.0}
+
+    def merge_stats(self, stats):
+        for field, value in stats.items():
+            self.stats[field] += value
+
+    def get_config(self):
+        return {'version': EXTRACTOR_VERSION, 'items': self.items, 'unscaled_items': sorted(UNSCALED_ITEMS), 'unit_scales': UNIT_SCALES,
+                'inline_units': _INLINE_UNIT}
+
+    def extract(self, content, page_num):
+        """回傳 {item: [{'value', 'raw_value', 'unit', 'period', 'page', 'context'}]}，value已換算為元"""
+        start_time = time.perf_counter()
+        financial_data = defaultdict(list)
+
+        if content:
+            text = content.lower()
+            if len(text) != len(content):
+                content = text  # 少數字元轉小寫後長度改變，context改取小寫內容
+            page_unit = self._page_unit(text)
+            periods = self._page_periods(text)
+            percent_layout = bool(_PERCENT_HEADER.search(text))
+
+            for match in self.pattern.finditer(text):
+                label = match.group('label')
+                item = self.label_to_item.get(_WHITESPACE.sub(' ', label) if ' ' in label else label)
+                if item is None:
+                    continue
+
+                try:
+                    values = [parse_value(value) for value in _VALUE_PATTERN.findall(match.group('values'))]
+                except ValueError:
+                    continue
+
+                # 百分比 (如淨利率) 不是金額
+                if not match.group('unit') and text[match.end():match.end() + 3].lstrip().startswith('%'):
+                    values = values[:-1]
+                values = self._drop_percent_columns(values, percent_layout)
+                if not values:
+                    continue
+
+                unit = match.group('unit') or page_unit
+                scale = 1 if item in UNSCALED_ITEMS else UNIT_SCALES.get(unit, 1)
+                # 一列多個數值時依序對應頁面上的期間欄位；欄數多於期間時無法判斷對應，不標示期間
+                column_periods = periods if len(periods) >= len(values) else []
+
+                for column, raw_value in enumerate(values):
+                    financial_data[item].append({
+                        'value': raw_value * scale,
+                        'raw_value': raw_value,
+                        'unit': '元' if unit or item in UNSCALED_ITEMS else None,
+                        'period': column_periods[column] if column_periods else None,
+                        'page': page_num,
+                        'context': content[match.start():match.end()]
+                    })
+
+        self.stats['pages'] += 1
+        self.stats['facts'] += sum(len(values) for values in financial_data.values())
+        self.stats['seconds'] += time.perf_counter() - start_time
+        return financial_data
+
+    def _drop_percent_columns(self, values, percent_layout):
+        """「金額 % 金額 %」排列時只保留金額欄
+
+        偶數欄皆為大於100的金額、奇數欄皆在0~100之間即視為百分比欄；只有一組金額與百分比時
+        可能是兩期金額，需頁面上有「金額 %」欄位標題才判斷為百分比。
+        """
+        if len(values) < 2 or len(values) % 2 or not (percent_layout or len(values) >= 4):
+            return values
+        amounts, percents = values[0::2], values[1::2]
+        if all(abs(amount) > 100 for amount in amounts) and all(0 <= percent <= 100 for percent in percents):
+            return amounts
+        return values
+
+    def _page_unit(self, content):
+        match = _PAGE_UNIT_PATTERN.search(content)
+        if not match:
+            return None
+        return match.group(1) or match.group(2)
+
+    def _page_periods(self, text):
+        """依出現順序列出頁面上的期間 (欄位標題)"""
+        found = []
+        if '年' in text:
+            found.extend((match.start(), normalize_year_period(match)) for match in _YEAR_PATTERN.finditer(text))
+        if 'q' in text:
+            for match in _QUARTER_PATTERN.finditer(text):
+                fy_year, fy_quarter, q_quarter, q_year = match.groups()
+                found.append((match.start(), f"{fy_year or q_year}Q{fy_quarter or q_quarter}"))
+
+        periods = []
+        for _, period in sorted(found):
+            if period and period not in periods:
+                periods.append(period)
+        return periods
@@ -0,0 +1,143 @@
+import threading
+import logging
+from collections import defaultdict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tesserocr
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+
+try:
+    import pytesseract
+    PYTESSERACT_AVAILABLE = True
+    # 設定Tesseract路徑 (WSL/Ubuntu)
+    pytesseract.pytesseract.tesseract_cmd = '/usr/bin/tesseract'
+except ImportError:
+    PYTESSERACT_AVAILABLE = False
+
+TESSERACT_AVAILABLE = TESSEROCR_AVAILABLE or PYTESSERACT_AVAILABLE
+
+
+def parse_tesseract_config(config, default_lang='chi_tra+eng'):
+    """解析 '--oem 3 --psm 6 -l chi_tra+eng' 形式的設定，回傳 (lang, psm, oem)"""
+    tokens = config.split()
+    lang, psm, oem = default_lang, 3, 3
+
+    for i, token in enumerate(tokens[:-1]):
+        if token == '-l':
+            lang = tokens[i + 1]
+        elif token == '--psm':
+            psm = int(tokens[i + 1])
+        elif token == '--oem':
+            oem = int(tokens[i + 1])
+
+    return lang, psm, oem
+
+
+class PytesseractBackend:
+    """每次呼叫啟動tesseract子程序 (fallback)"""
+
+    name = 'pytesseract'
+
+    def version(self):
+        return str(pytesseract.get_tesseract_version())
+
+    def image_to_string(self, image, config):
+        lang, _, _ = parse_tesseract_config(config)
+        return pytesseract.image_to_string(image, config=config, lang=lang)
+
+    def recognize(self, image, config):
+        """回傳 (文字, 信心度)；取得字詞信心度需再執行一次tesseract，此後端不提供"""
+        return self.image_to_string(image, config), None
+
+
+class TesserocrBackend:
+    """常駐的Tesseract API: 語言模型每個引擎只載入一次，直接接收numpy緩衝區"""
+
+    name = 'tesserocr'
+
+    def __init__(self):
+        # (lang, oem) -> 閒置的引擎，各執行緒借用後歸還
+        self._idle_apis = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def version(self):
+        return tesserocr.tesseract_version().splitlines()[0].split()[-1]
+
+    def image_to_string(self, image, config):
+        return self.recognize(image, config)[0]
+
+    def recognize(self, image, config):
+        """回傳 (文字, 平均字詞信心度 0~1)"""
+        lang, psm, oem = parse_tesseract_config(config)
+        api = self._acquire(lang, oem)
+
+        try:
+            api.SetPageSegMode(psm)
+            if isinstance(image, np.ndarray):
+                array = np.ascontiguousarray(image)
+                channels = 1 if array.ndim == 2 else array.shape[2]
+                api.SetImageBytes(array.tobytes(), array.shape[1], array.shape[0], channels, array.strides[0])
+            else:
+                api.SetImage(image)
+            text = api.GetUTF8Text()
+            return text, api.MeanTextConf() / 100
+        finally:
+            api.Clear()
+            self._release(lang, oem, api)
+
+    def _acquire(self, lang, oem):
+        with self._lock:
+            idle = self._idle_apis[(lang, oem)]
+            if idle:
+                return idle.pop()
+
+        logger.info(f"載入Tesseract模型: {lang}")
+        return tesserocr.PyTessBaseAPI(lang=lang, oem=oem)
+
+    def _release(self, lang, oem, api):
+        with self._lock:
+            self._idle_apis[(lang, oem)].append(api)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_backend_info = None
+
+
+def get_ocr_backend():
+    """每個程序共用一個OCR後端，優先使用常駐的tesserocr"""
+    global _backend
+
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if TESSEROCR_AVAILABLE:
+                    _backend = TesserocrBackend()
+                elif PYTESSERACT_AVAILABLE:
+                    _backend = PytesseractBackend()
+
+    return _backend
+
+
+def get_ocr_backend_info():
+    """OCR後端名稱與Tesseract版本 (不可用時皆為None)，納入解析快取鍵，安裝或升級Tesseract後不沿用舊結果"""
+    global _backend_info
+
+    if _backend_info is None:
+        backend = get_ocr_backend()
+        info = {'backend': None, 'version': None}
+        if backend is not None:
+            try:
+                info = {'backend': backend.name, 'version': backend.version()}
+            except Exception as e:
+                # 已安裝Python套件但找不到tesseract執行檔，實際上無法OCR
+                logger.warning(f"無法取得Tesseract版本: {e}")
+        _backend_info = info
+
+    return _backend_info
@@ -0,0 +1,75 @@
+import ctypes
+
+import fitz
+import numpy as np
+
+
+def pixmap_to_array(pixmap):
+    """以numpy view包裝pixmap樣本緩衝區 (不複製)，陣列存活期間pixmap不會被釋放"""
+    if hasattr(pixmap, 'samples_ptr'):
+        samples = (ctypes.c_ubyte * (pixmap.stride * pixmap.height)).from_address(pixmap.samples_ptr)
+        # 由ctypes緩衝區持有pixmap參照，numpy view經由它維持pixmap存活
+        samples.pixmap = pixmap
+    else:
+        samples = pixmap.samples
+    rows = np.frombuffer(samples, dtype=np.uint8).reshape(pixmap.height, pixmap.stride)
+    array = rows[:, :pixmap.width * pixmap.n]
+    if pixmap.n > 1:
+        array = array.reshape(pixmap.height, pixmap.width, pixmap.n)
+    return array
+
+
+class PageContext:
+    """單頁提取上下文: 延遲計算並快取文字、版面與渲染結果，每頁的MuPDF工作只做一次"""
+
+    def __init__(self, page):
+        self.page = page
+        self._textpage = None
+        self._text = None
+        self._text_dict = None
+        self._drawings = None
+        self._images = None
+        self._gray_renders = {}
+
+    @property
+    def textpage(self):
+        # TEXTFLAGS_DICT與純文字預設旗標只差在保留圖片區塊，兩者可共用同一份TextPage
+        if self._textpage is None:
+            self._textpage = self.page.get_textpage(flags=fitz.TEXTFLAGS_DICT)
+        return self._textpage
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self.page.get_text(textpage=self.textpage)
+        return self._text
+
+    @property
+    def text_dict(self):
+        if self._text_dict is None:
+            self._text_dict = self.page.get_text("dict", textpage=self.textpage)
+        return self._text_dict
+
+    @property
+    def drawings(self):
+        if self._drawings is None:
+            self._drawings = self.page.get_drawings()
+        return self._drawings
+
+    @property
+    def images(self):
+        if self._images is None:
+            self._images = self.page.get_images(full=True)
+        return self._images
+
+    def render_gray(self, zoom, clip=None):
+        """直接以灰階色彩空間渲染 (可只渲染clip範圍)，回傳不複製的numpy陣列"""
+        key = (zoom, tuple(clip) if clip is not None else None)
+        gray = self._gray_renders.get(key)
+        if gray is None:
+            pixmap = self.page.get_pixmap(
+                matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False, clip=clip
+            )
+            gray = pixmap_to_array(pixmap)
+            self._gray_renders[key] = gray
+        return gray
@@ -0,0 +1,184 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def hash_file(path, hasher=None):
+    hasher = hasher or hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(block)
+    return hasher
+
+
+class ParseCache:
+    """以PDF內容雜湊 + 解析設定為鍵的解析結果快取 (LRU容量上限)"""
+
+    def __init__(self, cache_dir="outputs/cache/parse", max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def make_key(self, pdf_path, parser_config):
+        hasher = hash_file(pdf_path)
+        config_blob = json.dumps(parser_config, sort_keys=True, ensure_ascii=False)
+        hasher.update(config_blob.encode('utf-8'))
+        return hasher.hexdigest()
+
+    def load(self, key, output_path):
+        """命中時將快取檔案還原至output_path (含附屬檔)，回傳是否命中"""
+        entry_dir = os.path.join(self.cache_dir, key)
+        manifest = self._read_manifest(entry_dir)
+        if manifest is None:
+            return False
+
+        base = os.path.splitext(output_path)[0]
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        for suffix in manifest['artifacts']:
+            shutil.copyfile(os.path.join(entry_dir, 'artifact' + suffix), base + suffix)
+
+        # 更新存取時間供LRU淘汰使用
+        os.utime(entry_dir)
+        return True
+
+    def store(self, key, artifact_paths):
+        """將解析產物存入快取，artifact_paths[0]為主要輸出檔"""
+        if not artifact_paths:
+            return
+
+        base = os.path.splitext(artifact_paths[0])[0]
+        entry_dir = os.path.join(self.cache_dir, key)
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}"
+
+        try:
+            os.makedirs(tmp_dir, exist_ok=True)
+            suffixes = []
+            for path in artifact_paths:
+                suffix = path[len(base):]
+                shutil.copyfile(path, os.path.join(tmp_dir, 'artifact' + suffix))
+                suffixes.append(suffix)
+
+            with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+                json.dump({'artifacts': suffixes}, f)
+
+            if os.path.exists(entry_dir):
+                shutil.rmtree(entry_dir)
+            os.replace(tmp_dir, entry_dir)
+
+        except OSError as e:
+            logger.warning(f"寫入解析快取失敗: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        self._evict(keep=key)
+
+    def _read_manifest(self, entry_dir):
+        try:
+            with open(os.path.join(entry_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _evict(self, keep=None):
+        """超過容量上限時依最後存取時間淘汰最舊的項目"""
+        entries = []
+
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            if not os.path.isdir(entry_dir) or '.tmp-' in name or name == keep:
+                continue
+
+            size = sum(
+                os.path.getsize(os.path.join(entry_dir, filename))
+                for filename in os.listdir(entry_dir)
+            )
+            entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+
+        keep_bytes = 0
+        if keep:
+            keep_dir = os.path.join(self.cache_dir, keep)
+            keep_bytes = sum(
+                os.path.getsize(os.path.join(keep_dir, filename))
+                for filename in os.listdir(keep_dir)
+            )
+
+        for entry_dir in _evict_lru(entries, self.max_bytes - keep_bytes):
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            logger.info(f"淘汰解析快取: {os.path.basename(entry_dir)[:12]}")
+
+
+class PageCache:
+    """單頁分析與處理結果快取，鍵為頁面內容雜湊 + 解析設定"""
+
+    def __init__(self, cache_dir="outputs/cache/pages", max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def load(self, key):
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key, entry):
+        path = self._entry_path(key)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"寫入頁面快取失敗: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def evict(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+
+        entries = []
+        for root, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        evicted = 0
+        for path in _evict_lru(entries, self.max_bytes):
+            try:
+                os.remove(path)
+                evicted += 1
+            except OSError:
+                continue
+
+        if evicted:
+            logger.info(f"淘汰頁面快取: {evicted} 頁")
+
+
+def _evict_lru(entries, max_bytes):
+    """entries為(mtime, size, path)，回傳需淘汰的路徑使總容量不超過max_bytes"""
+    total_bytes = sum(size for _, size, _ in entries)
+    evicted = []
+
+    for mtime, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        evicted.append(path)
+        total_bytes -= size
+
+    return evicted
@@ -1,34 +1,76 @@
 import os
 import re
-import io
+import json
+import copy
+import time
+import hashlib
 import cv2
 import numpy as np
-from PIL import Image, ImageEnhance, ImageFilter
 import fitz  # PyMuPDF
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import logging
 
+from .parse_cache import ParseCache, PageCache
+from .page_context import PageContext
+from .report_store import PageRecordWriter, ParsedReport, records_path_for, columns_path_for
+from .financial_extractor import FinancialValueExtractor
+from .ocr_backend import TESSERACT_AVAILABLE, get_ocr_backend, get_ocr_backend_info
+
 # 設定日誌
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-try:
-    import pytesseract
-    TESSERACT_AVAILABLE = True
-    # 設定Tesseract路徑 (WSL/Ubuntu)
-    pytesseract.pytesseract.tesseract_cmd = '/usr/bin/tesseract'
-except ImportError:
-    TESSERACT_AVAILABLE = False
-
 try:
     import pdfplumber
     PDFPLUMBER_AVAILABLE = True
 except ImportError:
     PDFPLUMBER_AVAILABLE = False
 
+# 各處理階段版本號，修改對應處理邏輯時遞增，使頁面快取只重做受影響的頁面
+STRATEGY_VERSIONS = {
+    'analysis': 3,
+    'ocr_enhanced': 4,
+    'hybrid': 2,
+    'structured_extraction': 1,
+    'text_extraction': 1,
+    'basic_extraction': 1,
+    'fallback': 1
+}
+
+
+def _process_page_range(agent, pdf_path, start, end):
+    """worker程序: 各自開啟fitz文件處理指定頁面範圍，連同本區段的OCR與影像增強統計回傳"""
+    # 保留主程序的OCR統計作為設定排序依據，只回傳本區段的增量
+    ocr_stats_before = copy.deepcopy(agent.ocr_stats)
+    agent.enhance_stats = {}
+    agent.region_stats = agent._new_region_stats()
+    agent.financial_extractor.stats = agent.financial_extractor.new_stats()
+    doc = fitz.open(pdf_path)
+    try:
+        page_results = [agent._process_page(doc[page_num], page_num) for page_num in range(start, end)]
+        return page_results, {
+            'ocr_stats': agent._diff_ocr_stats(ocr_stats_before),
+            'enhance_stats': agent.enhance_stats,
+            'region_stats': agent.region_stats,
+            'extract_stats': agent.financial_extractor.stats
+        }
+    finally:
+        doc.close()
+
+
 class FinancialTableAgent:
     
-    def __init__(self):
+    def __init__(self, workers=1, cache_dir="outputs/cache", cache_max_mb=2048,
+                 ocr_workers=4, ocr_quality_threshold=None, ocr_wave_size=2, enhance_profile='auto'):
+        # 平行處理worker數 (1 = 單一程序, 0 = 依CPU核心數)
+        self.workers = workers if workers and workers > 0 else (os.cpu_count() or 1)
+        
+        # 解析結果快取: 整份報告與單頁快取各使用cache_max_mb的一半，合計不超過上限
+        cache_max_bytes = cache_max_mb * 1024 * 1024
+        self.parse_cache = ParseCache(os.path.join(cache_dir, "parse"), cache_max_bytes // 2)
+        self.page_cache = PageCache(os.path.join(cache_dir, "pages"), cache_max_bytes - cache_max_bytes // 2)
+        
         self.table_patterns = {
             # 投資明細表格模式
             'investment_table': {
@@ -59,14 +101,141 @@ class FinancialTableAgent:
             'dense_text': r'--oem 3 --psm 11 -l chi_tra+eng',
             'sparse_text': r'--oem 3 --psm 8 -l chi_tra+eng'
         }
+        
+        # OCR設定平行執行數與提前結束的信心度門檻 (0~1，None = 執行全部設定)
+        # 提前結束需要tesserocr提供的字詞信心度；設定門檻時每次只執行ocr_wave_size個設定，
+        # 前一批已達門檻就不再執行後面的設定
+        self.ocr_workers = max(1, ocr_workers)
+        self.ocr_quality_threshold = ocr_quality_threshold
+        self.ocr_wave_size = max(1, ocr_wave_size)
+        
+        # 各OCR設定的累計勝出統計，用於淘汰不曾勝出的設定
+        self.ocr_stats_path = os.path.join(cache_dir, "ocr_stats.json")
+        self._load_ocr_stats()
+        
+        # OCR前影像增強流程: auto依雜訊估計選擇，乾淨的原生PDF渲染不需要NL-means去噪
+        self.enhance_profile = enhance_profile
+        self.enhance_profiles = {
+            'fast': ['median', 'threshold'],
+            'quality': ['nl_means', 'clahe', 'sharpen', 'threshold']
+        }
+        self.noise_threshold = 2.0
+        self.enhance_stats = {}
+        
+        # 表格範圍偵測: 只OCR框線圍出的區域 (單位: PDF點)
+        self.table_region_settings = {
+            'min_segment_length': 10,
+            'merge_tolerance': 6,
+            'min_segments': 4,
+            'min_width': 100,
+            'min_height': 30,
+            'margin': 4,
+            'min_ocr_chars': 20
+        }
+        self.region_stats = self._new_region_stats()
+        
+        # 財務數值提取 (預先編譯，每頁單次掃描)
+        self.financial_extractor = FinancialValueExtractor()
+        
+        # 最近一次處理的統計與財務數據
+        self.last_run = None
+        
+        # 渲染倍率
+        self.zoom_factors = {
+            'visual_analysis': 1.5,
+            'ocr_enhanced': 3.0,
+            'simple_ocr': 2.0
+        }
+    
+    def get_parser_config(self):
+        """影響解析輸出的設定，作為快取鍵的一部分"""
+        return {
+            'table_patterns': self.table_patterns,
+            'ocr_configs': self.ocr_configs,
+            'ocr_quality_threshold': self.ocr_quality_threshold,
+            'zoom_factors': self.zoom_factors,
+            'enhance_profile': self.enhance_profile,
+            'enhance_profiles': self.enhance_profiles,
+            'noise_threshold': self.noise_threshold,
+            'table_region_settings': self.table_region_settings,
+            'strategy_versions': STRATEGY_VERSIONS,
+            'ocr_backend': get_ocr_backend_info(),
+            'pdfplumber': PDFPLUMBER_AVAILABLE
+        }
+    
+    def extract_text_cached(self, pdf_path, output_path, force_reparse=False):
+        """以PDF內容雜湊快取解析結果，回傳完整報告文字；只需逐頁內容時改用iter_page_records_cached"""
+        for _ in self.iter_page_records_cached(pdf_path, output_path, force_reparse):
+            pass
+        
+        with open(output_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    
+    def iter_page_records_cached(self, pdf_path, output_path, force_reparse=False):
+        """逐頁產生結構化紀錄: 快取命中時從逐頁紀錄檔讀取，否則每頁解析完成即產生，只有PDF或解析設定變更時才重新解析"""
+        cache_key = self.parse_cache.make_key(pdf_path, self._report_cache_config(output_path))
+        
+        if not force_reparse and self.parse_cache.load(cache_key, output_path):
+            parsed_report = ParsedReport.open(output_path)
+            if parsed_report is not None:
+                print(f"使用解析快取: {os.path.basename(pdf_path)}")
+                with parsed_report:
+                    yield from parsed_report.iter_pages()
+                return
+        
+        failed_pages = 0
+        for page_result in self.iter_extract_pages(pdf_path, output_path):
+            record = self._page_record(page_result)
+            failed_pages += record['method'] == 'failed'
+            yield record
+        
+        # 有失敗頁面時不寫入快取，下次執行重試失敗頁 (成功頁面由單頁快取沿用)
+        if failed_pages:
+            print(f"{failed_pages} 頁處理失敗，不寫入解析快取")
+            return
+        # 全部頁面處理完成才寫入快取，中途停止讀取時不會留下不完整的項目
+        self.parse_cache.store(cache_key, self._output_artifacts(output_path))
+    
+    def _report_cache_config(self, output_path):
+        """整份報告快取的鍵值設定: 頁面解析設定之外，還包含只影響報告輸出的設定"""
+        # 產物清單納入鍵值，舊版快取 (只有.txt) 不會搭配到過期的附屬檔
+        base = os.path.splitext(output_path)[0]
+        artifact_suffixes = [path[len(base):] for path in self._output_artifacts(output_path)]
+        
+        return dict(
+            self.get_parser_config(),
+            output_artifacts=artifact_suffixes,
+            financial_extractor=self.financial_extractor.get_config()
+        )
+    
+    def _output_artifacts(self, output_path):
+        return [output_path, records_path_for(output_path), columns_path_for(output_path)]
     
     def extract_text_from_pdf(self, pdf_path, output_path=None):
         """AI Agent主要處理流程"""
+        extracted_content = []
+        for page_result in self.iter_extract_pages(pdf_path, output_path):
+            if not output_path:
+                extracted_content.append(page_result['formatted_page'])
+        
+        if output_path:
+            with open(output_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        
+        return self._generate_agent_report(
+            extracted_content, self.last_run['financial_data'], self.last_run['agent_stats']
+        )
+    
+    def iter_extract_pages(self, pdf_path, output_path=None):
+        """依頁碼順序逐頁產生處理結果，並即時附加寫入output_path，統計摘要在結束時寫在檔尾"""
         logger.info(f"🤖 財報表格AI Agent啟動: {os.path.basename(pdf_path)}")
         
         # 檢查工具可用性
         self._check_dependencies()
         
+        output_file = None
+        record_writer = None
+        
         try:
             doc = fitz.open(pdf_path)
             total_pages = len(doc)
@@ -78,64 +247,237 @@ class FinancialTableAgent:
                 'ocr_pages': 0,
                 'hybrid_pages': 0,
                 'failed_pages': 0,
-                'financial_tables_found': 0
+                'financial_tables_found': 0,
+                'cached_pages': 0
             }
             
-            extracted_content = []
             financial_data = defaultdict(list)
             
+            if output_path:
+                os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+                output_file = open(output_path, 'w', encoding='utf-8')
+                output_file.write(self._agent_report_header())
+                record_writer = PageRecordWriter(output_path)
+            
             print(f"開始處理 {total_pages} 頁財報")
             
-            for page_num in range(total_pages):
-                page = doc[page_num]
-                
-                # AI頁面智能分析
-                page_analysis = self._ai_analyze_page(page, page_num)
-                
-                # 根據分析結果選擇最佳處理策略
-                processing_result = self._process_page_with_ai(page, page_num, page_analysis)
+            workers = min(self.workers, total_pages)
+            if workers > 1:
+                print(f"平行處理: {workers} 個worker")
+                page_results = self._process_pages_parallel(pdf_path, total_pages, workers)
+            else:
+                page_results = (self._process_page(doc[page_num], page_num) for page_num in range(total_pages))
+            
+            # 依頁碼順序合併結果
+            for page_result in page_results:
+                page_num = page_result['page_num']
+                processing_result = page_result['processing_result']
                 
                 # 更新統計
                 agent_stats[f"{processing_result['method']}_pages"] += 1
                 if processing_result['is_financial_table']:
                     agent_stats['financial_tables_found'] += 1
+                if page_result['from_cache']:
+                    agent_stats['cached_pages'] += 1
                 
-                # 提取財務數據
-                if processing_result['content']:
-                    extracted_financial = self._extract_financial_data(
-                        processing_result['content'], page_num + 1
-                    )
-                    if extracted_financial:
-                        for category, data in extracted_financial.items():
-                            financial_data[category].extend(data)
+                for category, data in page_result['financial_data'].items():
+                    financial_data[category].extend(data)
                 
-                # 格式化頁面內容
-                formatted_page = self._format_agent_page(
-                    processing_result, page_num + 1, page_analysis
-                )
-                extracted_content.append(formatted_page)
+                # 每頁完成即寫入，中途失敗也保留已處理的頁面
+                if output_file:
+                    output_file.write('\n' + page_result['formatted_page'])
+                    output_file.flush()
+                    record_writer.write(self._page_record(page_result))
+                
+                yield page_result
                 
                 # 進度顯示
                 if (page_num + 1) % 10 == 0:
                     print(f"✅ 已處理 {page_num + 1}/{total_pages} 頁")
             
             doc.close()
+            self.page_cache.evict()
+            self._save_ocr_stats()
             
-            final_report = self._generate_agent_report(
-                extracted_content, financial_data, agent_stats
-            )
+            if output_file:
+                output_file.write('\n' + self._agent_report_trailer(financial_data, agent_stats))
+                output_file.close()
+                output_file = None
+                record_writer.close()
+                logger.info(f"報告已儲存: {output_path}")
             
-            if output_path:
-                self._save_agent_report(final_report, output_path)
+            self.last_run = {'agent_stats': agent_stats, 'financial_data': financial_data}
             
             print(f"AI Agent處理完成！")
             self._print_agent_summary(agent_stats)
             
-            return final_report
-            
         except Exception as e:
             logger.error(f"AI Agent處理失敗: {e}")
             raise Exception(f"財報AI Agent錯誤: {e}")
+        
+        finally:
+            if output_file:
+                output_file.close()
+            if record_writer:
+                record_writer.close()
+    
+    def _page_record(self, page_result):
+        """逐頁結構化紀錄 (不含頁首格式)"""
+        page_analysis = page_result['page_analysis']
+        processing_result = page_result['processing_result']
+        
+        return {
+            'page': page_result['page_num'] + 1,
+            'text': processing_result['content'],
+            'method': processing_result['method'],
+            'strategy': processing_result['strategy'],
+            'content_type': page_analysis.get('content_type', 'unknown'),
+            'table_type': page_analysis.get('table_type', 'unknown'),
+            'complexity_level': page_analysis.get('complexity_level', 'medium'),
+            'is_financial_table': processing_result['is_financial_table'],
+            'success': processing_result['success'],
+            'financial_data': page_result['financial_data']
+        }
+    
+    def _process_page(self, page, page_num):
+        """單頁完整處理: 分析、策略處理、財務數據提取與格式化"""
+        ctx = PageContext(page)
+        page_key = self._page_cache_key(ctx)
+        page_analysis, processing_result = self._load_cached_page(page_key, page_num)
+        from_cache = processing_result is not None
+        
+        # AI頁面智能分析
+        if page_analysis is None:
+            page_analysis = self._ai_analyze_page(ctx, page_num)
+        
+        # 根據分析結果選擇最佳處理策略
+        if processing_result is None:
+            processing_result = self._process_page_with_ai(ctx, page_num, page_analysis)
+            
+            # 失敗頁不快取，下次執行時重試
+            if processing_result['method'] != 'failed':
+                self.page_cache.store(page_key, {
+                    'analysis_version': STRATEGY_VERSIONS['analysis'],
+                    'strategy_version': self._strategy_fingerprint(processing_result['strategy']),
+                    'page_analysis': page_analysis,
+                    'processing_result': processing_result
+                })
+        
+        # 提取財務數據
+        financial_data = {}
+        if processing_result['content']:
+            financial_data = self._extract_financial_data(
+                processing_result['content'], page_num + 1
+            )
+        
+        # 格式化頁面內容
+        formatted_page = self._format_agent_page(
+            processing_result, page_num + 1, page_analysis
+        )
+        
+        return {
+            'page_num': page_num,
+            'page_analysis': page_analysis,
+            'processing_result': processing_result,
+            'financial_data': dict(financial_data),
+            'formatted_page': formatted_page,
+            'from_cache': from_cache
+        }
+    
+    def _page_cache_key(self, ctx):
+        """頁面內容雜湊: 內容串流、圖片與字型等頁面輸入 + 頁面分析的設定
+
+        處理階段的版本與設定不在鍵中，改由快取項目記錄的指紋判斷，只重做有變更的階段。
+        """
+        page = ctx.page
+        doc = page.parent
+        hasher = hashlib.sha256()
+        
+        hasher.update(repr((tuple(page.rect), page.rotation)).encode('utf-8'))
+        for xref in page.get_contents():
+            hasher.update(doc.xref_stream_raw(xref) or b'')
+        for image in ctx.images:
+            hasher.update(doc.xref_stream_raw(image[0]) or b'')
+        for xobject in page.get_xobjects():
+            hasher.update(doc.xref_stream_raw(xobject[0]) or b'')
+        hasher.update(repr(page.get_fonts(full=True)).encode('utf-8'))
+        
+        config_blob = json.dumps(self._analysis_config(), sort_keys=True, ensure_ascii=False)
+        hasher.update(config_blob.encode('utf-8'))
+        return hasher.hexdigest()
+    
+    def _analysis_config(self):
+        """影響頁面分析 (分類與策略選擇) 的設定"""
+        return {
+            'table_patterns': self.table_patterns,
+            'visual_zoom': self.zoom_factors['visual_analysis'],
+            'tesseract_available': TESSERACT_AVAILABLE
+        }
+    
+    def _strategy_config(self, strategy):
+        """各處理策略實際使用的設定，純文字提取的策略不受OCR設定影響"""
+        if strategy == 'ocr_enhanced':
+            return {
+                'ocr_configs': self.ocr_configs,
+                'zoom': self.zoom_factors['ocr_enhanced'],
+                'enhance_profile': self.enhance_profile,
+                'enhance_profiles': self.enhance_profiles,
+                'noise_threshold': self.noise_threshold,
+                'table_region_settings': self.table_region_settings,
+                'ocr_quality_threshold': self.ocr_quality_threshold,
+                'ocr_backend': get_ocr_backend_info()
+            }
+        if strategy == 'hybrid':
+            return {
+                'ocr_config': self.ocr_configs['high_accuracy'],
+                'zoom': self.zoom_factors['simple_ocr'],
+                'ocr_backend': get_ocr_backend_info()
+            }
+        return {}
+    
+    def _strategy_fingerprint(self, strategy):
+        """處理階段的版本號 + 設定，記錄在頁面快取項目中"""
+        blob = json.dumps(
+            {'version': STRATEGY_VERSIONS.get(strategy), 'config': self._strategy_config(strategy)},
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()[:16]
+    
+    def _load_cached_page(self, page_key, page_num):
+        """依版本號決定可重用的快取: 分析與處理皆有效、僅分析有效、或皆無效"""
+        cached = self.page_cache.load(page_key)
+        if not cached or cached.get('analysis_version') != STRATEGY_VERSIONS['analysis']:
+            return None, None
+        
+        # 相同內容的頁面可能出現在不同頁碼
+        page_analysis = cached['page_analysis']
+        page_analysis['page_num'] = page_num + 1
+        
+        strategy = cached['processing_result']['strategy']
+        if cached.get('strategy_version') != self._strategy_fingerprint(strategy):
+            return page_analysis, None
+        
+        return page_analysis, cached['processing_result']
+    
+    def _process_pages_parallel(self, pdf_path, total_pages, workers):
+        """以process pool分段處理頁面，依頁碼順序回傳結果"""
+        # 切成比worker數更多的區段，平衡各頁處理時間差異
+        chunk_count = min(total_pages, workers * 4)
+        chunk_size = -(-total_pages // chunk_count)
+        page_ranges = [(start, min(start + chunk_size, total_pages))
+                       for start in range(0, total_pages, chunk_size)]
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_process_page_range, self, pdf_path, start, end)
+                       for start, end in page_ranges]
+            for future in futures:
+                page_results, run_stats = future.result()
+                self._merge_ocr_stats(run_stats['ocr_stats'])
+                self._merge_enhance_stats(run_stats['enhance_stats'])
+                for field, value in run_stats['region_stats'].items():
+                    self.region_stats[field] += value
+                self.financial_extractor.merge_stats(run_stats['extract_stats'])
+                yield from page_results
     
     def _check_dependencies(self):
         """檢查依賴工具"""
@@ -143,8 +485,8 @@ class FinancialTableAgent:
         
         if TESSERACT_AVAILABLE:
             try:
-                test_result = pytesseract.get_tesseract_version()
-                tools_status.append(f"Tesseract {test_result}")
+                ocr_backend = get_ocr_backend()
+                tools_status.append(f"Tesseract {ocr_backend.version()} ({ocr_backend.name})")
             except Exception:
                 tools_status.append("Tesseract配置錯誤")
         else:
@@ -163,13 +505,13 @@ class FinancialTableAgent:
             print(f"   {status}")
         print()
     
-    def _ai_analyze_page(self, page, page_num):
+    def _ai_analyze_page(self, ctx, page_num):
         """AI智能頁面分析"""
         try:
             # 多重分析策略
-            text_analysis = self._analyze_text_content(page)
-            structure_analysis = self._analyze_page_structure(page)
-            visual_analysis = self._analyze_visual_features(page)
+            text_analysis = self._analyze_text_content(ctx)
+            structure_analysis = self._analyze_page_structure(ctx)
+            visual_analysis = self._triage_visual_features(ctx, text_analysis, structure_analysis)
             
             # AI決策邏輯
             analysis_result = {
@@ -195,8 +537,8 @@ class FinancialTableAgent:
                 'recommended_strategy': 'fallback'
             }
     
-    def _analyze_text_content(self, page):
-        text = page.get_text()
+    def _analyze_text_content(self, ctx):
+        text = ctx.text
         
         # 計算各種特徵
         char_count = len(text)
@@ -227,9 +569,9 @@ class FinancialTableAgent:
             'has_substantial_content': char_count > 100
         }
     
-    def _analyze_page_structure(self, page):
+    def _analyze_page_structure(self, ctx):
         try:
-            text_dict = page.get_text("dict")
+            text_dict = ctx.text_dict
             
             blocks_count = len(text_dict.get("blocks", []))
             
@@ -276,16 +618,87 @@ class FinancialTableAgent:
         
         return aligned_blocks / max(total_blocks, 1) > 0.3
     
-    def _analyze_visual_features(self, page):
+    def _triage_visual_features(self, ctx, text_analysis, structure_analysis):
+        """分層視覺分析: 線條不影響複雜度時略過，其次用向量線條，只有掃描頁才點陣化"""
+        no_lines = {
+            'has_lines': False,
+            'line_count': 0,
+            'text_density': 0,
+            'is_mostly_text': False,
+            'source': 'skipped'
+        }
+        
+        # 視覺特徵只影響複雜度分數 (+2)，兩種情況結果相同就不需分析
+        level_without_lines = self._assess_complexity(text_analysis, structure_analysis, no_lines)
+        level_with_lines = self._assess_complexity(
+            text_analysis, structure_analysis, dict(no_lines, line_count=21)
+        )
+        if level_without_lines == level_with_lines:
+            return no_lines
+        
+        # 原生PDF的表格框線通常是向量路徑
+        vector_analysis = self._analyze_vector_features(ctx)
+        if vector_analysis['has_lines'] or not vector_analysis['has_images']:
+            return vector_analysis
+        
+        return self._analyze_visual_features(ctx)
+    
+    def _analyze_vector_features(self, ctx):
         try:
-            mat = fitz.Matrix(1.5, 1.5)  # 中等解析度
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
+            # 與HoughLinesP的minLineLength (點陣像素) 對應的PDF長度
+            min_length = 100 / self.zoom_factors['visual_analysis']
+            line_count = len(self._collect_ruling_segments(ctx, min_length))
             
-            image = Image.open(io.BytesIO(img_data))
+            return {
+                'has_lines': line_count > 10,
+                'line_count': line_count,
+                'text_density': 0,
+                'is_mostly_text': False,
+                'has_images': bool(ctx.images),
+                'source': 'vector'
+            }
             
-            gray_image = image.convert('L')
-            img_array = np.array(gray_image)
+        except Exception:
+            return {
+                'has_lines': False,
+                'line_count': 0,
+                'text_density': 0,
+                'is_mostly_text': False,
+                'has_images': True,
+                'source': 'vector'
+            }
+    
+    def _collect_ruling_segments(self, ctx, min_length):
+        """從向量路徑取出水平/垂直框線，回傳 (x0, y0, x1, y1) 線段"""
+        segments = []
+        
+        for path in ctx.drawings:
+            for item in path['items']:
+                if item[0] == 'l':
+                    start, end = item[1], item[2]
+                    is_ruling = abs(start.x - end.x) < 1 or abs(start.y - end.y) < 1
+                    if is_ruling and abs(end - start) >= min_length:
+                        segments.append((min(start.x, end.x), min(start.y, end.y),
+                                         max(start.x, end.x), max(start.y, end.y)))
+                elif item[0] == 're':
+                    rect = item[1]
+                    if min(rect.width, rect.height) <= 2:
+                        # 細長矩形常用來繪製框線
+                        if max(rect.width, rect.height) >= min_length:
+                            segments.append(tuple(rect))
+                    elif 's' in (path.get('type') or ''):
+                        if rect.width >= min_length:
+                            segments.append((rect.x0, rect.y0, rect.x1, rect.y0))
+                            segments.append((rect.x0, rect.y1, rect.x1, rect.y1))
+                        if rect.height >= min_length:
+                            segments.append((rect.x0, rect.y0, rect.x0, rect.y1))
+                            segments.append((rect.x1, rect.y0, rect.x1, rect.y1))
+        
+        return segments
+    
+    def _analyze_visual_features(self, ctx):
+        try:
+            img_array = ctx.render_gray(self.zoom_factors['visual_analysis'])  # 中等解析度
             
             edges = cv2.Canny(img_array, 50, 150)
             lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=50, minLineLength=100, maxLineGap=10)
@@ -298,7 +711,8 @@ class FinancialTableAgent:
                 'has_lines': line_count > 10,
                 'line_count': line_count,
                 'text_density': text_density,
-                'is_mostly_text': text_density > 0.1
+                'is_mostly_text': text_density > 0.1,
+                'source': 'raster'
             }
             
         except Exception:
@@ -306,7 +720,8 @@ class FinancialTableAgent:
                 'has_lines': False,
                 'line_count': 0,
                 'text_density': 0,
-                'is_mostly_text': False
+                'is_mostly_text': False,
+                'source': 'raster'
             }
     
     def _determine_content_type(self, text_analysis, structure_analysis):
@@ -381,21 +796,21 @@ class FinancialTableAgent:
         else:
             return 'basic_extraction'
     
-    def _process_page_with_ai(self, page, page_num, analysis):
+    def _process_page_with_ai(self, ctx, page_num, analysis):
         strategy = analysis['recommended_strategy']
         
         try:
             if strategy == 'ocr_enhanced':
-                content = self._process_with_ocr_enhanced(page)
+                content = self._process_with_ocr_enhanced(ctx)
                 method = 'ocr'
             elif strategy == 'hybrid':
-                content = self._process_with_hybrid_method(page)
+                content = self._process_with_hybrid_method(ctx)
                 method = 'hybrid'
             elif strategy == 'structured_extraction':
-                content = self._process_with_structured_extraction(page)
+                content = self._process_with_structured_extraction(ctx)
                 method = 'table'
             else:
-                content = self._process_with_basic_extraction(page)
+                content = self._process_with_basic_extraction(ctx)
                 method = 'table'
             
             return {
@@ -416,62 +831,301 @@ class FinancialTableAgent:
                 'success': False
             }
     
-    def _process_with_ocr_enhanced(self, page):
+    def _process_with_ocr_enhanced(self, ctx):
         if not TESSERACT_AVAILABLE:
-            return self._process_with_basic_extraction(page)
+            return self._process_with_basic_extraction(ctx)
         
         try:
-            mat = fitz.Matrix(3.0, 3.0)
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            
-            image = Image.open(io.BytesIO(img_data))
-            enhanced_image = self._enhance_for_table_ocr(image)
-            
-            ocr_results = []
-            
-            for config_name, config in self.ocr_configs.items():
-                try:
-                    result = pytesseract.image_to_string(
-                        enhanced_image, 
-                        config=config,
-                        lang='chi_tra+eng'
-                    )
-                    if result and len(result.strip()) > 100:
-                        ocr_results.append((config_name, result))
-                except Exception:
-                    continue
+            table_regions = self._detect_table_regions(ctx)
+            if table_regions:
+                return self._process_table_regions(ctx, table_regions)
             
-            if ocr_results:
-                best_result = max(ocr_results, key=lambda x: len(x[1]))
-                processed_text = self._post_process_ocr_result(best_result[1])
-                return self._reconstruct_table_from_ocr(processed_text)
+            gray = ctx.render_gray(self.zoom_factors['ocr_enhanced'])
+            ocr_text = self._ocr_image(gray)
+            if ocr_text is not None:
+                return ocr_text
             
-            return self._process_with_basic_extraction(page)
+            return self._process_with_basic_extraction(ctx)
             
         except Exception as e:
             logger.warning(f"OCR增強處理失敗: {e}")
-            return self._process_with_basic_extraction(page)
+            return self._process_with_basic_extraction(ctx)
+    
+    def _ocr_image(self, image, min_chars=100):
+        """增強影像並執行OCR，回傳重建後的表格文字，無有效結果時回傳None"""
+        enhanced_image = self._enhance_for_table_ocr(image)
+        ocr_results = self._run_ocr_configs(enhanced_image, min_chars)
+        
+        if not ocr_results:
+            return None
+        
+        # 同長度時max取設定順序在前者，與逐一執行的結果相同
+        best_result = max(ocr_results, key=lambda x: len(x[1]))
+        self._config_stats(best_result[0])['wins'] += 1
+        processed_text = self._post_process_ocr_result(best_result[1])
+        return self._reconstruct_table_from_ocr(processed_text)
+    
+    def _detect_table_regions(self, ctx):
+        """由框線找出表格範圍: 原生PDF用向量路徑，掃描頁改用Hough線段"""
+        segments = self._collect_ruling_segments(ctx, self.table_region_settings['min_segment_length'])
+        
+        if not segments and ctx.images:
+            segments = self._detect_raster_ruling_segments(ctx)
+        
+        return self._cluster_table_regions(segments, ctx.page.rect)
+    
+    def _detect_raster_ruling_segments(self, ctx):
+        zoom = self.zoom_factors['visual_analysis']
+        img_array = ctx.render_gray(zoom)
+        
+        edges = cv2.Canny(img_array, 50, 150)
+        lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=50, minLineLength=100, maxLineGap=10)
+        if lines is None:
+            return []
+        
+        segments = []
+        for x1, y1, x2, y2 in lines[:, 0]:
+            if abs(int(x1) - int(x2)) <= 2 or abs(int(y1) - int(y2)) <= 2:
+                segments.append((min(x1, x2) / zoom, min(y1, y2) / zoom,
+                                 max(x1, x2) / zoom, max(y1, y2) / zoom))
+        return segments
+    
+    def _cluster_table_regions(self, segments, page_rect):
+        """將彼此相鄰的框線合併成表格範圍，過濾線段過少或過小的區域"""
+        settings = self.table_region_settings
+        tolerance = settings['merge_tolerance']
+        
+        # [x0, y0, x1, y1, 線段數]
+        regions = []
+        for x0, y0, x1, y1 in segments:
+            region = [x0, y0, x1, y1, 1]
+            merged = True
+            while merged:
+                merged = False
+                for other in regions:
+                    if (other[0] - tolerance <= region[2] and region[0] <= other[2] + tolerance and
+                            other[1] - tolerance <= region[3] and region[1] <= other[3] + tolerance):
+                        region = [min(region[0], other[0]), min(region[1], other[1]),
+                                  max(region[2], other[2]), max(region[3], other[3]),
+                                  region[4] + other[4]]
+                        regions.remove(other)
+                        merged = True
+                        break
+            regions.append(region)
+        
+        table_regions = []
+        margin = settings['margin']
+        for x0, y0, x1, y1, count in regions:
+            if count < settings['min_segments'] or x1 - x0 < settings['min_width'] or y1 - y0 < settings['min_height']:
+                continue
+            rect = fitz.Rect(x0 - margin, y0 - margin, x1 + margin, y1 + margin) & page_rect
+            table_regions.append(rect)
+        
+        table_regions.sort(key=lambda rect: (rect.y0, rect.x0))
+        return table_regions
+    
+    def _process_table_regions(self, ctx, table_regions):
+        """只渲染並OCR表格範圍，其餘部分使用原生文字，依垂直位置合併"""
+        zoom = self.zoom_factors['ocr_enhanced']
+        parts = []
+        
+        for rect in table_regions:
+            gray = ctx.render_gray(zoom, clip=rect)
+            ocr_text = self._ocr_image(gray, min_chars=self.table_region_settings['min_ocr_chars'])
+            if ocr_text is None:
+                ocr_text = self._clean_basic_text(self._native_text_in(ctx, rect))
+            if ocr_text:
+                parts.append((rect.y0, ocr_text))
+        
+        for block in ctx.text_dict.get("blocks", []):
+            if "lines" not in block or self._block_in_regions(block, table_regions):
+                continue
+            block_text = self._block_text(block)
+            if block_text.strip():
+                parts.append((block["bbox"][1], self._clean_basic_text(block_text)))
+        
+        page_area = abs(ctx.page.rect)
+        self.region_stats['pages'] += 1
+        self.region_stats['regions'] += len(table_regions)
+        self.region_stats['page_area'] += page_area
+        self.region_stats['ocr_area'] += min(sum(abs(rect) for rect in table_regions), page_area)
+        
+        parts.sort(key=lambda part: part[0])
+        return '\n'.join(text for _, text in parts)
+    
+    def _native_text_in(self, ctx, rect):
+        return '\n'.join(
+            self._block_text(block)
+            for block in ctx.text_dict.get("blocks", [])
+            if "lines" in block and self._block_in_regions(block, [rect])
+        )
+    
+    def _block_in_regions(self, block, regions):
+        x0, y0, x1, y1 = block["bbox"]
+        center = fitz.Point((x0 + x1) / 2, (y0 + y1) / 2)
+        return any(center in rect for rect in regions)
     
-    def _enhance_for_table_ocr(self, image):
+    def _block_text(self, block):
+        return '\n'.join(
+            ''.join(span["text"] for span in line["spans"])
+            for line in block["lines"]
+        )
+    
+    def _run_ocr_configs(self, image, min_chars=100):
+        """以執行緒平行執行各OCR設定 (Tesseract為子程序)，依設定順序取用結果，輸出與執行快慢無關
+
+        設定ocr_quality_threshold時依設定順序分批執行，遇到平均字詞信心度達門檻的結果即停止，
+        後面批次的設定不再執行；未設定時所有設定一次送出。
+        """
+        config_names = list(self.ocr_configs)
+        ocr_results = []
+        
+        wave_size = len(config_names)
+        if self.ocr_quality_threshold is not None:
+            wave_size = min(self.ocr_wave_size, self.ocr_workers)
+        
+        executor = ThreadPoolExecutor(max_workers=min(self.ocr_workers, len(config_names)))
+        futures = []
         try:
-            cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-            
-            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-            
-            denoised = cv2.fastNlMeansDenoising(gray)
-            clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
-            enhanced = clahe.apply(denoised)
+            for wave_start in range(0, len(config_names), wave_size):
+                wave_names = config_names[wave_start:wave_start + wave_size]
+                futures = [executor.submit(self._run_single_ocr, image, self.ocr_configs[name]) for name in wave_names]
+                
+                stopped = False
+                for config_name, future in zip(wave_names, futures):
+                    result, confidence, elapsed = future.result()
+                    config_stats = self._config_stats(config_name)
+                    config_stats['runs'] += 1
+                    config_stats['seconds'] += elapsed
+                    
+                    if result and len(result.strip()) > min_chars:
+                        ocr_results.append((config_name, result))
+                        
+                        if (self.ocr_quality_threshold is not None and confidence is not None and
+                                confidence >= self.ocr_quality_threshold):
+                            config_stats['early_stops'] += 1
+                            stopped = True
+                            break
+                if stopped:
+                    break
+        finally:
+            # 同一批中尚未開始的設定直接取消，執行中的Tesseract在背景結束
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+        
+        return ocr_results
+    
+    def _run_single_ocr(self, image, config):
+        start_time = time.perf_counter()
+        try:
+            result, confidence = get_ocr_backend().recognize(image, config)
+        except Exception:
+            result, confidence = None, None
+        return result, confidence, time.perf_counter() - start_time
+    
+    def _new_ocr_stats(self):
+        return {name: self._empty_config_stats() for name in self.ocr_configs}
+    
+    def _empty_config_stats(self):
+        return {'runs': 0, 'wins': 0, 'early_stops': 0, 'seconds': 0.0}
+    
+    def _config_stats(self, name):
+        return self.ocr_stats.setdefault(name, self._empty_config_stats())
+    
+    def _merge_ocr_stats(self, ocr_stats):
+        for name, stats in ocr_stats.items():
+            target = self._config_stats(name)
+            for field in target:
+                target[field] += stats.get(field, 0)
+    
+    def _diff_ocr_stats(self, ocr_stats_before):
+        return {
+            name: {
+                field: value - ocr_stats_before.get(name, {}).get(field, 0)
+                for field, value in stats.items()
+            }
+            for name, stats in self.ocr_stats.items()
+        }
+    
+    def _load_ocr_stats(self):
+        self.ocr_stats = self._new_ocr_stats()
+        try:
+            with open(self.ocr_stats_path, 'r', encoding='utf-8') as f:
+                saved_stats = json.load(f)
+            self._merge_ocr_stats({name: stats for name, stats in saved_stats.items() if name in self.ocr_configs})
+        except (OSError, ValueError, AttributeError):
+            pass
+    
+    def _save_ocr_stats(self):
+        try:
+            os.makedirs(os.path.dirname(self.ocr_stats_path), exist_ok=True)
+            with open(self.ocr_stats_path, 'w', encoding='utf-8') as f:
+                json.dump(self.ocr_stats, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logger.warning(f"儲存OCR統計失敗: {e}")
+    
+    def _enhance_for_table_ocr(self, gray):
+        try:
+            timings = {}
+            profile = self.enhance_profile
             
-            kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-            sharpened = cv2.filter2D(enhanced, -1, kernel)
+            if profile == 'auto':
+                start_time = time.perf_counter()
+                noise = self._estimate_noise(gray)
+                timings['noise_estimate'] = time.perf_counter() - start_time
+                profile = 'quality' if noise > self.noise_threshold else 'fast'
             
-            binary = cv2.adaptiveThreshold(sharpened, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+            image = gray
+            for stage in self.enhance_profiles[profile]:
+                start_time = time.perf_counter()
+                image = self._apply_enhance_stage(stage, image)
+                timings[stage] = time.perf_counter() - start_time
             
-            return Image.fromarray(binary)
+            self._record_enhance_timings(profile, timings)
+            return image
             
         except Exception:
-            return image
+            return gray
+    
+    def _estimate_noise(self, gray):
+        """以Laplacian反應的中位數估計雜訊標準差 (對文字邊緣不敏感)"""
+        kernel = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+        response = cv2.filter2D(gray[::2, ::2], cv2.CV_32F, kernel)
+        # 此kernel對高斯雜訊的反應標準差為 6 * sigma
+        return float(np.median(np.abs(response))) / 0.6745 / 6
+    
+    def _apply_enhance_stage(self, stage, image):
+        if stage == 'nl_means':
+            return cv2.fastNlMeansDenoising(image)
+        elif stage == 'median':
+            return cv2.medianBlur(image, 3)
+        elif stage == 'clahe':
+            clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
+            return clahe.apply(image)
+        elif stage == 'sharpen':
+            kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
+            return cv2.filter2D(image, -1, kernel)
+        elif stage == 'threshold':
+            return cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+        else:
+            raise ValueError(f"未知的影像增強步驟: {stage}")
+    
+    def _new_region_stats(self):
+        return {'pages': 0, 'regions': 0, 'page_area': 0.0, 'ocr_area': 0.0}
+    
+    def _record_enhance_timings(self, profile, timings):
+        profile_stats = self.enhance_stats.setdefault(profile, {'pages': 0, 'seconds': {}})
+        profile_stats['pages'] += 1
+        for stage, elapsed in timings.items():
+            profile_stats['seconds'][stage] = profile_stats['seconds'].get(stage, 0.0) + elapsed
+    
+    def _merge_enhance_stats(self, enhance_stats):
+        for profile, stats in enhance_stats.items():
+            profile_stats = self.enhance_stats.setdefault(profile, {'pages': 0, 'seconds': {}})
+            profile_stats['pages'] += stats['pages']
+            for stage, elapsed in stats['seconds'].items():
+                profile_stats['seconds'][stage] = profile_stats['seconds'].get(stage, 0.0) + elapsed
     
     def _post_process_ocr_result(self, text):
         if not text:
@@ -492,7 +1146,7 @@ class FinancialTableAgent:
         corrected_text = text
         for wrong, correct in corrections.items():
             if len(wrong) == 1:  # 單字符修正
-                corrected_text = re.sub(f'(\\d){re.escape(wrong)}(\\d)', f'\\1{correct}\\2', corrected_text)
+                corrected_text = re.sub(f'(\\d){re.escape(wrong)}(\\d)', f'\\g<1>{correct}\\g<2>', corrected_text)
             else:  
                 corrected_text = re.sub(wrong, correct, corrected_text, flags=re.IGNORECASE)
         
@@ -534,16 +1188,16 @@ class FinancialTableAgent:
         
         return line
     
-    def _process_with_hybrid_method(self, page):
+    def _process_with_hybrid_method(self, ctx):
         results = []
         
-        basic_text = page.get_text()
+        basic_text = ctx.text
         if basic_text:
             results.append("=== 基本文字提取 ===")
             results.append(self._clean_basic_text(basic_text))
         
         try:
-            structured_text = self._extract_structured_layout(page)
+            structured_text = self._extract_structured_layout(ctx)
             if structured_text and len(structured_text) > 100:
                 results.append("=== 結構化提取 ===")
                 results.append(structured_text)
@@ -552,7 +1206,7 @@ class FinancialTableAgent:
         
         if TESSERACT_AVAILABLE and sum(len(r) for r in results) < 500:
             try:
-                ocr_text = self._simple_ocr_extract(page)
+                ocr_text = self._simple_ocr_extract(ctx)
                 if ocr_text and len(ocr_text) > 100:
                     results.append("=== OCR補充 ===")
                     results.append(ocr_text)
@@ -561,9 +1215,9 @@ class FinancialTableAgent:
         
         return '\n\n'.join(results) if results else "混合處理失敗"
     
-    def _extract_structured_layout(self, page):
+    def _extract_structured_layout(self, ctx):
         try:
-            text_dict = page.get_text("dict")
+            text_dict = ctx.text_dict
             
             elements = []
             for block in text_dict.get("blocks", []):
@@ -626,30 +1280,21 @@ class FinancialTableAgent:
         
         return "".join(formatted_parts)
     
-    def _simple_ocr_extract(self, page):
+    def _simple_ocr_extract(self, ctx):
         try:
-            mat = fitz.Matrix(2.0, 2.0)
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            
-            image = Image.open(io.BytesIO(img_data))
-            
-            result = pytesseract.image_to_string(
-                image,
-                config=self.ocr_configs['high_accuracy'],
-                lang='chi_tra+eng'
-            )
+            gray = ctx.render_gray(self.zoom_factors['simple_ocr'])
+            result = get_ocr_backend().image_to_string(gray, self.ocr_configs['high_accuracy'])
             
             return self._post_process_ocr_result(result)
             
         except Exception:
             return ""
     
-    def _process_with_structured_extraction(self, page):
-        return self._extract_structured_layout(page)
+    def _process_with_structured_extraction(self, ctx):
+        return self._extract_structured_layout(ctx)
     
-    def _process_with_basic_extraction(self, page):
-        return self._clean_basic_text(page.get_text())
+    def _process_with_basic_extraction(self, ctx):
+        return self._clean_basic_text(ctx.text)
     
     def _clean_basic_text(self, text):
         if not text:
@@ -666,45 +1311,7 @@ class FinancialTableAgent:
         return text.strip()
     
     def _extract_financial_data(self, content, page_num):
-        financial_data = defaultdict(list)
-        
-        if not content:
-            return financial_data
-        
-        patterns = {
-            'revenue': [
-                r'營業收入[淨]?[：:\s]*[NT\$]?\s*(\d{1,3}(?:,\d{3})*)',
-                r'revenue[：:\s]*[NT\$]?\s*(\d{1,3}(?:,\d{3})*)',
-                r'淨營業收入[：:\s]*[NT\$]?\s*(\d{1,3}(?:,\d{3})*)'
-            ],
-            'net_income': [
-                r'淨利[潤]?[：:\s]*[NT\$]?\s*(\d{1,3}(?:,\d{3})*)',
-                r'本期淨利[：:\s]*[NT\$]?\s*(\d{1,3}(?:,\d{3})*)',
-                r'net\s+income[：:\s]*[NT\$]?\s*(\d{1,3}(?:,\d{3})*)'
-            ],
-            'total_assets': [
-                r'資產總額[：:\s]*[NT\$]?\s*(\d{1,3}(?:,\d{3})*)',
-                r'總資產[：:\s]*[NT\$]?\s*(\d{1,3}(?:,\d{3})*)',
-                r'total\s+assets[：:\s]*[NT\$]?\s*(\d{1,3}(?:,\d{3})*)'
-            ]
-        }
-        
-        for category, pattern_list in patterns.items():
-            for pattern in pattern_list:
-                matches = re.finditer(pattern, content, re.IGNORECASE)
-                for match in matches:
-                    try:
-                        value_str = match.group(1).replace(',', '')
-                        value = float(value_str)
-                        financial_data[category].append({
-                            'value': value,
-                            'page': page_num,
-                            'context': match.group(0)
-                        })
-                    except ValueError:
-                        continue
-        
-        return financial_data
+        return self.financial_extractor.extract(content, page_num)
     
     def _format_agent_page(self, processing_result, page_num, analysis):
         """格式化Agent頁面輸出"""
@@ -729,13 +1336,30 @@ class FinancialTableAgent:
         return f"\n{'='*80}\n{header}\n{'='*80}\n{content}"
     
     def _generate_agent_report(self, extracted_content, financial_data, agent_stats):
+        report_parts = [self._agent_report_header()]
+        report_parts.extend(extracted_content)
+        report_parts.append(self._agent_report_trailer(financial_data, agent_stats))
+        
+        return '\n'.join(report_parts)
+    
+    def _agent_report_header(self):
         report_parts = []
         
         report_parts.append("=" * 100)
         report_parts.append("財報表格處理AI Agent - 完整分析報告")
         report_parts.append("=" * 100)
         
-        report_parts.append(f"\n統計:")
+        # 完整內容 (逐頁寫入)
+        report_parts.append(f"\nAI Agent完整處理結果:")
+        
+        return '\n'.join(report_parts)
+    
+    def _agent_report_trailer(self, financial_data, agent_stats):
+        """統計摘要，處理完所有頁面後寫在報告檔尾"""
+        report_parts = []
+        
+        report_parts.append("\n" + "=" * 100)
+        report_parts.append(f"統計:")
         report_parts.append(f"  總頁數: {agent_stats['total_pages']}")
         report_parts.append(f"  表格頁: {agent_stats['table_pages']}")
         report_parts.append(f"  OCR頁: {agent_stats['ocr_pages']}")
@@ -743,7 +1367,7 @@ class FinancialTableAgent:
         report_parts.append(f"  失敗頁: {agent_stats['failed_pages']}")
         report_parts.append(f"  財務表格: {agent_stats['financial_tables_found']} 個")
         
-        success_rate = (agent_stats['total_pages'] - agent_stats['failed_pages']) / agent_stats['total_pages'] * 100
+        success_rate = (agent_stats['total_pages'] - agent_stats['failed_pages']) / max(agent_stats['total_pages'], 1) * 100
         report_parts.append(f"  成功率: {success_rate:.1f}%")
         
         if financial_data:
@@ -753,24 +1377,8 @@ class FinancialTableAgent:
                     unique_values = len(set(item['value'] for item in data_list))
                     report_parts.append(f"  {category}: {len(data_list)} 個數據點 ({unique_values} 個唯一值)")
         
-        # 完整內容
-        report_parts.append(f"\nAI Agent完整處理結果:")
-        report_parts.extend(extracted_content)
-        
         return '\n'.join(report_parts)
     
-    def _save_agent_report(self, report, output_path):
-        try:
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(report)
-            
-            logger.info(f"報告已儲存: {output_path}")
-            
-        except Exception as e:
-            logger.error(f"儲存失敗: {e}")
-    
     def _print_agent_summary(self, stats):
         print(f"\nAI Agent處理摘要:")
         print(f"智能策略選擇")
@@ -778,11 +1386,36 @@ class FinancialTableAgent:
         print(f"財務表格發現: {stats['financial_tables_found']} 個")
         print(f"OCR增強: {stats['ocr_pages']} 頁")
         print(f"混合處理: {stats['hybrid_pages']} 頁")
+        print(f"頁面快取命中: {stats['cached_pages']} 頁")
         
         if TESSERACT_AVAILABLE:
-            print(f"OCR引擎: 可用")
+            print(f"OCR引擎: 可用 ({get_ocr_backend().name})")
+            print(f"OCR設定統計 (累計):")
+            for name, config_stats in self.ocr_stats.items():
+                avg_seconds = config_stats['seconds'] / max(config_stats['runs'], 1)
+                print(f"  {name}: 執行 {config_stats['runs']} 次, 勝出 {config_stats['wins']} 次, "
+                      f"提前結束 {config_stats['early_stops']} 次, 平均 {avg_seconds:.2f} 秒")
         else:
             print(f"OCR引擎: 不可用")
+        
+        if self.region_stats['pages']:
+            area_ratio = self.region_stats['ocr_area'] / self.region_stats['page_area'] * 100
+            print(f"表格範圍OCR: {self.region_stats['pages']} 頁, {self.region_stats['regions']} 個區域, "
+                  f"OCR面積佔頁面 {area_ratio:.1f}%")
+        
+        if self.enhance_stats:
+            print(f"影像增強耗時 (每頁平均):")
+            for profile, profile_stats in self.enhance_stats.items():
+                stage_timings = ", ".join(
+                    f"{stage} {elapsed / profile_stats['pages'] * 1000:.0f}ms"
+                    for stage, elapsed in profile_stats['seconds'].items()
+                )
+                print(f"  {profile} ({profile_stats['pages']} 頁): {stage_timings}")
+        
+        extract_stats = self.financial_extractor.stats
+        if extract_stats['pages']:
+            pages_per_sec = extract_stats['pages'] / max(extract_stats['seconds'], 1e-9)
+            print(f"財務數值提取: {extract_stats['facts']} 筆, {pages_per_sec:.0f} 頁/秒")
     
     def process_reports(self, report_a_path, report_b_path, output_dir="outputs"):
         results = {}
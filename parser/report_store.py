@@ -0,0 +1,113 @@
+import os
+import json
+import mmap
+
+import numpy as np
+
+# 小型欄位另存為numpy陣列，不需解析整份逐頁紀錄即可取得
+COLUMN_FIELDS = ['page', 'method', 'strategy', 'content_type', 'table_type', 'complexity_level']
+
+
+def records_path_for(output_path):
+    return os.path.splitext(output_path)[0] + '.pages.jsonl'
+
+
+def columns_path_for(output_path):
+    return os.path.splitext(output_path)[0] + '.pages.npz'
+
+
+class PageRecordWriter:
+    """逐頁附加寫入結構化紀錄 (JSONL)，結束時寫出位移索引與欄位檔"""
+
+    def __init__(self, output_path):
+        self.records_path = records_path_for(output_path)
+        self.columns_path = columns_path_for(output_path)
+        self.offsets = []
+        self.columns = {field: [] for field in COLUMN_FIELDS}
+        self._file = open(self.records_path, 'wb')
+
+    def write(self, record):
+        self.offsets.append(self._file.tell())
+        for field in COLUMN_FIELDS:
+            self.columns[field].append(record.get(field))
+
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        self._file.write(line.encode('utf-8'))
+        self._file.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+
+        self.offsets.append(self._file.tell())
+        self._file.close()
+
+        columns = {
+            field: np.array([value if value is not None else '' for value in values])
+            for field, values in self.columns.items()
+            if field != 'page'
+        }
+        columns['page'] = np.array(self.columns['page'], dtype=np.int32)
+        columns['offsets'] = np.array(self.offsets, dtype=np.int64)
+
+        # np.savez會自動補上.npz副檔名，先寫暫存檔再改名
+        tmp_path = self.columns_path[:-len('.npz')] + '.tmp.npz'
+        np.savez(tmp_path, **columns)
+        os.replace(tmp_path, self.columns_path)
+
+
+class ParsedReport:
+    """以mmap讀取逐頁結構化紀錄，可只取單頁或單一欄位"""
+
+    def __init__(self, output_path):
+        self.records_path = records_path_for(output_path)
+
+        with np.load(columns_path_for(output_path)) as columns:
+            self.offsets = columns['offsets']
+            self._columns = {field: columns[field] for field in COLUMN_FIELDS}
+
+        self._file = open(self.records_path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else None
+        self._page_index = {int(page): i for i, page in enumerate(self._columns['page'])}
+
+    @classmethod
+    def open(cls, output_path):
+        """附屬檔不存在 (舊版輸出) 或不完整時回傳None"""
+        if not os.path.exists(records_path_for(output_path)) or not os.path.exists(columns_path_for(output_path)):
+            return None
+        try:
+            return cls(output_path)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def record(self, index):
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        return json.loads(self._mmap[start:end].decode('utf-8'))
+
+    def page(self, page_num):
+        """依頁碼 (從1開始) 取得單頁紀錄"""
+        index = self._page_index.get(page_num)
+        return self.record(index) if index is not None else None
+
+    def iter_pages(self):
+        for index in range(len(self)):
+            yield self.record(index)
+
+    def column(self, field):
+        if field in self._columns:
+            return self._columns[field].tolist()
+        return [record.get(field) for record in self.iter_pages()]
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
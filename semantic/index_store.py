@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from .keyword_index import KeywordIndex
+
+CSR_ARRAYS = ('data', 'indices', 'indptr')
+# 查詢使用的詞 x 切塊轉置矩陣另存一份，載入時不必在記憶體中轉置
+TERM_PREFIX = 'term_'
+
+
+class TfidfIndexStore:
+    """TF-IDF索引的磁碟快取: 詞彙與IDF存為npz，稀疏矩陣與其轉置的CSR陣列存為npy並以memory map載入，
+    BM25關鍵字索引存為keyword.npz
+
+    鍵為切塊文字與檢索設定的雜湊，輸入不變時啟動不必重新fit。
+    """
+
+    def __init__(self, index_dir="outputs/cache/tfidf", max_entries=4):
+        self.index_dir = index_dir
+        self.max_entries = max_entries
+
+    def make_key(self, texts, settings):
+        hasher = hashlib.sha256()
+        hasher.update(json.dumps(settings, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        for text in texts:
+            encoded = text.encode('utf-8')
+            hasher.update(len(encoded).to_bytes(8, 'little'))
+            hasher.update(encoded)
+        return hasher.hexdigest()
+
+    def load(self, key, vectorizer):
+        """將快取的詞彙與IDF設定到未fit的vectorizer，回傳 (vectorizer, tfidf_matrix, keyword_index, term_matrix)；
+        無快取時回傳None，舊版項目沒有的部分為None"""
+        entry_dir = os.path.join(self.index_dir, key)
+        meta_path = os.path.join(entry_dir, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+
+            with np.load(os.path.join(entry_dir, 'vocab.npz')) as vocab:
+                terms = vocab['terms']
+                idf = vocab['idf']
+
+            matrix = self._load_csr(entry_dir, '', tuple(meta['shape']))
+            term_matrix = None
+            if os.path.exists(os.path.join(entry_dir, f'{TERM_PREFIX}indptr.npy')):
+                term_matrix = self._load_csr(entry_dir, TERM_PREFIX, tuple(reversed(meta['shape'])))
+            
+            keyword_index = None
+            keyword_path = os.path.join(entry_dir, 'keyword.npz')
+            if os.path.exists(keyword_path):
+                with np.load(keyword_path) as keyword_arrays:
+                    keyword_index = KeywordIndex.from_arrays(keyword_arrays)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"索引快取讀取失敗: {str(e)}")
+            return None
+
+        vectorizer.vocabulary_ = {term: i for i, term in enumerate(terms.tolist())}
+        vectorizer.idf_ = idf
+        os.utime(meta_path)
+        return vectorizer, matrix, keyword_index, term_matrix
+
+    def _load_csr(self, entry_dir, prefix, shape):
+        arrays = [np.load(os.path.join(entry_dir, f'{prefix}{name}.npy'), mmap_mode='r') for name in CSR_ARRAYS]
+        return csr_matrix(tuple(arrays), shape=shape, copy=False)
+
+    def save(self, key, vectorizer, matrix, keyword_index=None, term_matrix=None):
+        entry_dir = os.path.join(self.index_dir, key)
+        tmp_dir = f"{entry_dir}.tmp{os.getpid()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        try:
+            terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+            np.savez(os.path.join(tmp_dir, 'vocab.npz'), terms=np.array(terms, dtype=str), idf=vectorizer.idf_)
+
+            matrix = matrix.tocsr()
+            if term_matrix is None:
+                term_matrix = matrix.T
+            term_matrix = term_matrix.tocsr()
+            for prefix, csr in (('', matrix), (TERM_PREFIX, term_matrix)):
+                for name in CSR_ARRAYS:
+                    np.save(os.path.join(tmp_dir, f'{prefix}{name}.npy'), getattr(csr, name))
+
+            if keyword_index is not None:
+                np.savez(os.path.join(tmp_dir, 'keyword.npz'), **keyword_index.to_arrays())
+
+            # meta.json最後寫入，載入時以它判斷項目是否完整
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump({'shape': list(matrix.shape), 'created_at': time.time()}, f)
+
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+        except OSError as e:
+            print(f"索引快取寫入失敗: {str(e)}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        self._evict()
+
+    def _evict(self):
+        """只保留最近使用的max_entries個索引"""
+        entries = []
+        for name in os.listdir(self.index_dir):
+            meta_path = os.path.join(self.index_dir, name, 'meta.json')
+            if os.path.exists(meta_path):
+                entries.append((os.path.getmtime(meta_path), name))
+
+        entries.sort(reverse=True)
+        for _, name in entries[self.max_entries:]:
+            shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
@@ -0,0 +1,96 @@
+import re
+from collections import Counter
+
+import numpy as np
+from scipy.sparse import csc_matrix
+
+_NUMBER = re.compile(r'\d+')
+
+
+class KeywordIndex:
+    """BM25倒排索引: 詞頻矩陣以CSC儲存，每個詞的postings (切塊, 詞頻) 即為一欄
+
+    查詢只讀取查詢詞的postings，耗時與命中的切塊數成正比而非與報告長度成正比。
+    """
+
+    def __init__(self, terms, postings, doc_lengths, numeric_density, k1=1.5, b=0.75, numeric_weight=0.1):
+        self.terms = list(terms)
+        self.term_ids = {term: i for i, term in enumerate(self.terms)}
+        self.postings = csc_matrix(postings)
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        # 數字密度 (0~1) 作為同分時偏好含數據切塊的加分
+        self.numeric_density = np.asarray(numeric_density, dtype=np.float32)
+        self.k1 = k1
+        self.b = b
+        self.numeric_weight = numeric_weight
+
+        n_docs = len(self.doc_lengths)
+        doc_freq = np.diff(self.postings.indptr)
+        self.idf = np.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        avg_length = float(self.doc_lengths.mean()) if n_docs else 0.0
+        self._length_norm = k1 * (1 - b + b * self.doc_lengths / max(avg_length, 1e-9))
+
+    @classmethod
+    def build(cls, token_lists, texts, **kwargs):
+        term_ids = {}
+        rows, cols, freqs = [], [], []
+        for doc_id, tokens in enumerate(token_lists):
+            for term, freq in Counter(tokens).items():
+                rows.append(doc_id)
+                cols.append(term_ids.setdefault(term, len(term_ids)))
+                freqs.append(freq)
+
+        postings = csc_matrix(
+            (np.array(freqs, dtype=np.float32), (np.array(rows, dtype=np.int32), np.array(cols, dtype=np.int32))),
+            shape=(len(token_lists), len(term_ids))
+        )
+        doc_lengths = [len(tokens) for tokens in token_lists]
+
+        numeric_counts = np.array([len(_NUMBER.findall(text)) / max(len(text), 1) for text in texts], dtype=np.float32)
+        if len(numeric_counts) and numeric_counts.max() > 0:
+            numeric_counts /= numeric_counts.max()
+
+        return cls(sorted(term_ids, key=term_ids.get), postings, doc_lengths, numeric_counts, **kwargs)
+
+    def search(self, query_terms, top_k=10):
+        """回傳 [(切塊索引, 分數)]，依分數由高到低"""
+        term_ids = sorted({self.term_ids[term] for term in query_terms if term in self.term_ids})
+        if not term_ids:
+            return []
+
+        indptr, indices, data = self.postings.indptr, self.postings.indices, self.postings.data
+        doc_parts, score_parts = [], []
+        for term_id in term_ids:
+            start, end = indptr[term_id], indptr[term_id + 1]
+            docs = indices[start:end]
+            freqs = data[start:end]
+            doc_parts.append(docs)
+            score_parts.append(self.idf[term_id] * freqs * (self.k1 + 1) / (freqs + self._length_norm[docs]))
+
+        docs, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        scores += self.numeric_weight * self.numeric_density[docs]
+
+        if len(scores) > top_k:
+            top = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(int(docs[i]), float(scores[i])) for i in top]
+
+    def to_arrays(self):
+        return {
+            'terms': np.array(self.terms, dtype=str),
+            'indptr': self.postings.indptr,
+            'indices': self.postings.indices,
+            'data': self.postings.data,
+            'doc_lengths': self.doc_lengths,
+            'numeric_density': self.numeric_density
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, **kwargs):
+        n_docs = len(arrays['doc_lengths'])
+        terms = arrays['terms'].tolist()
+        postings = csc_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=(n_docs, len(terms)))
+        return cls(terms, postings, arrays['doc_lengths'], arrays['numeric_density'], **kwargs)
@@ -1,14 +1,23 @@
-import re
-import jieba
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+
+from .token_budget import TokenBudget
+from .tokenizer import ChineseTokenizer
+from .keyword_index import KeywordIndex
 
 class LiteSemanticRetriever:
-    def __init__(self):
+    def __init__(self, token_budget=None, index_store=None):
         self.chunks = []
+        self.token_budget = token_budget or TokenBudget(calibration_path=None)
+        self.index_store = index_store
         self.vectorizer = None
         self.tfidf_matrix = None
+        self.keyword_index = None
+        # 詞 x 切塊的轉置矩陣與各切塊所屬報告，查詢時直接相乘與篩選
+        self.term_matrix = None
+        self.chunk_reports = None
+        # 列向量L2正規化後cosine similarity即為內積
+        self.vectorizer_params = {'max_features': 5000, 'ngram_range': (1, 2), 'norm': 'l2'}
         self.synonyms = {
             "營收": ["收入", "營業收入", "銷售收入", "revenue", "sales"],
             "獲利": ["盈利", "利潤", "淨利", "profit", "earnings"],
@@ -18,45 +27,110 @@ class LiteSemanticRetriever:
             "投資": ["investment", "資本支出"],
             "風險": ["risk", "不確定性"]
         }
+        # 預設的token_pattern會把整串中文當成一個詞，改用jieba分詞
+        self.tokenizer = ChineseTokenizer(
+            extra_terms=list(self.synonyms) + [term for terms in self.synonyms.values() for term in terms]
+        )
         
     def chunk_documents(self, report_a_text, report_b_text, chunk_size=500):
-        def smart_chunk(text, report_id):
-            paragraphs = text.split('\n\n')
-            chunks = []
-            current_chunk = ""
-            
-            for paragraph in paragraphs:
+        chunks_a = list(self.iter_chunks([report_a_text], 'A', chunk_size))
+        chunks_b = list(self.iter_chunks([report_b_text], 'B', chunk_size))
+        self.chunks = chunks_a + chunks_b
+        return self.chunks
+    
+    def chunk_page_records(self, records_a, records_b, chunk_size=500):
+        chunks_a = list(self.iter_page_chunks(records_a, 'A', chunk_size))
+        chunks_b = list(self.iter_page_chunks(records_b, 'B', chunk_size))
+        self.chunks = chunks_a + chunks_b
+        return self.chunks
+    
+    def iter_page_chunks(self, records, report_id, chunk_size=500):
+        """以逐頁結構化紀錄切塊，切塊不跨頁且保留頁碼"""
+        chunk_id = 0
+        
+        for record in records:
+            for chunk in self.iter_chunks([record['text']], report_id, chunk_size):
+                chunk['chunk_id'] = chunk_id
+                chunk['page'] = record['page']
+                chunk_id += 1
+                yield chunk
+    
+    def iter_chunks(self, texts, report_id, chunk_size=500):
+        """逐段切塊，texts可以是解析過程中逐頁產生的文字，不必等整份報告解析完成"""
+        current_chunk = ""
+        chunk_id = 0
+        
+        for text in texts:
+            for paragraph in text.split('\n\n'):
                 if len(current_chunk) + len(paragraph) <= chunk_size:
                     current_chunk += paragraph + '\n\n'
                 else:
                     if current_chunk.strip():
-                        chunks.append({
+                        yield {
                             'text': current_chunk.strip(),
                             'report_id': report_id,
-                            'chunk_id': len(chunks)
-                        })
+                            'chunk_id': chunk_id
+                        }
+                        chunk_id += 1
                     current_chunk = paragraph + '\n\n'
-            
-            if current_chunk.strip():
-                chunks.append({
-                    'text': current_chunk.strip(),
-                    'report_id': report_id,
-                    'chunk_id': len(chunks)
-                })
-            return chunks
         
-        chunks_a = smart_chunk(report_a_text, 'A')
-        chunks_b = smart_chunk(report_b_text, 'B')
-        self.chunks = chunks_a + chunks_b
-        return self.chunks
+        if current_chunk.strip():
+            yield {
+                'text': current_chunk.strip(),
+                'report_id': report_id,
+                'chunk_id': chunk_id
+            }
     
     def build_index(self, force_rebuild=False):
+        """建立TF-IDF索引；設定index_store時切塊與設定未變更就直接載入磁碟上的索引"""
         if not self.chunks:
             return
         
+        cache_key = None
+        if self.index_store is not None:
+            cache_key = self.index_store.make_key([chunk['text'] for chunk in self.chunks], self._index_settings())
+            if not force_rebuild:
+                loaded = self.index_store.load(cache_key, self._new_vectorizer())
+                # 舊版快取缺少關鍵字索引或轉置矩陣時重新建立
+                if loaded is not None and loaded[2] is not None and loaded[3] is not None:
+                    self._set_index(*loaded)
+                    self.tokenizer.warm_up()
+                    print("使用索引快取")
+                    return
+        
         texts = [self._expand_synonyms(chunk['text']) for chunk in self.chunks]
-        self.vectorizer = TfidfVectorizer(max_features=5000, ngram_range=(1, 2))
-        self.tfidf_matrix = self.vectorizer.fit_transform(texts)
+        vectorizer = self._new_vectorizer()
+        tfidf_matrix = vectorizer.fit_transform(texts)
+        # 分詞結果已在fit時快取，建立關鍵字索引不需重新分詞
+        keyword_index = KeywordIndex.build(
+            [self.tokenizer(text) for text in texts], [chunk['text'] for chunk in self.chunks]
+        )
+        self._set_index(vectorizer, tfidf_matrix, keyword_index)
+        
+        if cache_key is not None:
+            self.index_store.save(
+                cache_key, self.vectorizer, self.tfidf_matrix, self.keyword_index, self.term_matrix
+            )
+    
+    def _set_index(self, vectorizer, tfidf_matrix, keyword_index, term_matrix=None):
+        self.vectorizer = vectorizer
+        self.tfidf_matrix = tfidf_matrix
+        self.keyword_index = keyword_index
+        # 從快取載入時直接使用memory map的轉置矩陣
+        self.term_matrix = term_matrix if term_matrix is not None else tfidf_matrix.T.tocsr()
+        self.chunk_reports = np.array([chunk['report_id'] for chunk in self.chunks])
+    
+    def _new_vectorizer(self):
+        return TfidfVectorizer(tokenizer=self.tokenizer, token_pattern=None, lowercase=False, **self.vectorizer_params)
+    
+    def _index_settings(self):
+        """影響索引內容的設定，變更時快取鍵隨之改變"""
+        return {
+            'vectorizer': {name: list(value) if isinstance(value, tuple) else value
+                           for name, value in self.vectorizer_params.items()},
+            'tokenizer': self.tokenizer.get_config(),
+            'synonyms': self.synonyms
+        }
     
     def _expand_synonyms(self, text):
         expanded_text = text
@@ -67,76 +141,93 @@ class LiteSemanticRetriever:
         return expanded_text
     
     def semantic_search(self, query, top_k=5, score_threshold=0.1):
+        return self.search_many([query], top_k, score_threshold)[0]
+    
+    def search_many(self, queries, top_k=5, score_threshold=0.1, per_report=False):
+        """多個查詢以一次稀疏矩陣乘法計算相似度；per_report為True時每份報告各取top_k"""
         if self.vectorizer is None:
-            return []
+            return [[] for _ in queries]
         
-        expanded_query = self._expand_synonyms(query)
-        query_vector = self.vectorizer.transform([expanded_query])
-        similarities = cosine_similarity(query_vector, self.tfidf_matrix).flatten()
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+        query_matrix = self.vectorizer.transform([self._expand_synonyms(query) for query in queries])
+        # 結果只含與查詢有共同詞的切塊，不必對全部切塊排序
+        scores = (query_matrix @ self.term_matrix).tocsr()
         
-        results = []
-        for idx in top_indices:
-            score = similarities[idx]
-            if score >= score_threshold:
-                chunk = self.chunks[idx]
-                results.append({
-                    'text': chunk['text'],
-                    'report_id': chunk['report_id'],
-                    'chunk_id': chunk['chunk_id'],
-                    'similarity_score': float(score),
-                    'length': len(chunk['text'])
-                })
-        return results
+        all_results = []
+        for row in range(len(queries)):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            indices = scores.indices[start:end]
+            values = scores.data[start:end]
+            keep = values >= score_threshold
+            indices, values = indices[keep], values[keep]
+            
+            if per_report:
+                reports = self.chunk_reports[indices]
+                positions = np.concatenate([
+                    np.flatnonzero(reports == report_id)[self._top_k(values[reports == report_id], top_k)]
+                    for report_id in np.unique(reports)
+                ]) if len(indices) else np.arange(0)
+                positions = positions[np.argsort(-values[positions], kind='stable')]
+            else:
+                positions = self._top_k(values, top_k)
+            
+            all_results.append([self._search_result(indices[pos], values[pos]) for pos in positions])
+        return all_results
+    
+    def _top_k(self, values, k):
+        """argpartition取出前k名後只排序這k個，回傳在values中的位置"""
+        if len(values) > k:
+            top = np.argpartition(-values, k)[:k]
+        else:
+            top = np.arange(len(values))
+        return top[np.argsort(-values[top], kind='stable')]
     
-    def smart_context_selection(self, query, max_tokens=15000):
+    def _search_result(self, idx, score):
+        chunk = self.chunks[idx]
+        return {
+            'text': chunk['text'],
+            'report_id': chunk['report_id'],
+            'chunk_id': chunk['chunk_id'],
+            'page': chunk.get('page'),
+            'similarity_score': float(score),
+            'length': len(chunk['text'])
+        }
+    
+    def smart_context_selection(self, query, max_tokens=6000):
+        """依相關度挑選切塊直到填滿max_tokens (以token_budget估算的token數計)"""
         search_results = self.semantic_search(query, top_k=15)
         
         if not search_results:
             search_results = self._keyword_fallback(query)
         
         selected_chunks = []
-        total_length = 0
+        total_tokens = 0
         
         for result in search_results:
-            chunk_length = len(result['text'])
-            if total_length + chunk_length <= max_tokens:
+            # 標籤與切塊間的空行也佔用token
+            chunk_tokens = self.token_budget.estimate(f"{self._chunk_label(result)}\n{result['text']}\n\n")
+            if total_tokens + chunk_tokens <= max_tokens:
                 selected_chunks.append(result)
-                total_length += chunk_length
+                total_tokens += chunk_tokens
             else:
-                remaining_space = max_tokens - total_length
-                if remaining_space > 200:
-                    result['text'] = result['text'][:remaining_space-50] + "..."
+                remaining_tokens = max_tokens - total_tokens - self.token_budget.estimate(self._chunk_label(result)) - 5
+                if remaining_tokens > 100:
+                    result['text'] = self.token_budget.truncate(result['text'], remaining_tokens) + "..."
                     selected_chunks.append(result)
                 break
         
-        context_parts = [f"報告{chunk['report_id']}\n{chunk['text']}" for chunk in selected_chunks]
+        context_parts = [f"{self._chunk_label(chunk)}\n{chunk['text']}" for chunk in selected_chunks]
         final_context = "\n\n".join(context_parts)
         return final_context, selected_chunks
     
+    def _chunk_label(self, chunk):
+        if chunk.get('page'):
+            return f"報告{chunk['report_id']} 第{chunk['page']}頁"
+        return f"報告{chunk['report_id']}"
+    
     def _keyword_fallback(self, query):
-        keywords = jieba.cut(query)
-        results = []
-        
-        for chunk in self.chunks:
-            score = 0
-            text_lower = chunk['text'].lower()
-            
-            for keyword in keywords:
-                if len(keyword) > 1:
-                    score += text_lower.count(keyword.lower()) * 2
-            
-            numbers = re.findall(r'\d+', chunk['text'])
-            score += len(numbers) * 0.1
-            
-            if score > 0:
-                results.append({
-                    'text': chunk['text'],
-                    'report_id': chunk['report_id'],
-                    'chunk_id': chunk['chunk_id'],
-                    'similarity_score': score / 10,
-                    'length': len(chunk['text'])
-                })
+        """TF-IDF無結果時以BM25關鍵字索引查詢"""
+        if self.keyword_index is None:
+            return []
         
-        results.sort(key=lambda x: x['similarity_score'], reverse=True)
-        return results[:10]
+        query_terms = self.tokenizer(self._expand_synonyms(query))
+        return [self._search_result(idx, score) for idx, score in self.keyword_index.search(query_terms, top_k=10)]
@@ -0,0 +1,157 @@
+import os
+import re
+import json
+import threading
+from functools import lru_cache
+
+# 各類字元的預設token數 (依llama3分詞器的經驗值)，實際比例由Ollama回報的prompt_eval_count校正
+DEFAULT_RATES = {
+    'cjk': 1.0,
+    'latin': 0.25,
+    'digit': 0.34,
+    'space': 0.1,
+    'other': 0.8
+}
+
+# 聊天模板為每則訊息加入的token (角色標頭與結束標記)
+MESSAGE_OVERHEAD = 5
+
+_SCRIPT_PATTERNS = {
+    'cjk': re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]'),
+    'latin': re.compile(r'[A-Za-z]'),
+    'digit': re.compile(r'[0-9]'),
+    'space': re.compile(r'\s')
+}
+
+
+@lru_cache(maxsize=8192)
+def _script_counts(text):
+    """各類字元數；同一切塊會被重複估算，結果以文字為鍵快取"""
+    counts = {script: len(pattern.findall(text)) for script, pattern in _SCRIPT_PATTERNS.items()}
+    counts['other'] = len(text) - sum(counts.values())
+    return counts
+
+
+def _char_script(char):
+    for script, pattern in _SCRIPT_PATTERNS.items():
+        if pattern.match(char):
+            return script
+    return 'other'
+
+
+class TokenBudget:
+    """依字元類別估算token數，並以模型實際回報的prompt token數校正，用來把檢索內容裝進num_ctx"""
+
+    def __init__(self, model_name="llama3:latest", num_ctx=8192, calibration_path="outputs/cache/token_calibration.json",
+                 safety_ratio=0.95):
+        # model_name可以是回傳模型名稱的函式 (如背景連線檢查後才決定的模型)，第一次估算時才解析並載入校正
+        self._model_name = model_name
+        self.num_ctx = num_ctx
+        self.calibration_path = calibration_path
+        # 估算有誤差，只使用num_ctx的safety_ratio比例
+        self.safety_ratio = safety_ratio
+        self.scale = 1.0
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._calibration_loaded = False
+        self._load_lock = threading.Lock()
+
+    @property
+    def model_name(self):
+        if callable(self._model_name):
+            self._model_name = self._model_name()
+        return self._model_name
+
+    def _ensure_calibration(self):
+        if self._calibration_loaded:
+            return
+        with self._load_lock:
+            if not self._calibration_loaded:
+                self._load_calibration()
+                self._calibration_loaded = True
+
+    def estimate(self, text):
+        if not text:
+            return 0
+        self._ensure_calibration()
+        counts = _script_counts(text)
+        raw = sum(counts[script] * rate for script, rate in DEFAULT_RATES.items())
+        return int(raw * self.scale + 0.999)
+
+    def estimate_messages(self, messages):
+        return sum(self.estimate(message['content']) + MESSAGE_OVERHEAD for message in messages) + MESSAGE_OVERHEAD
+
+    def available(self, messages, reserve_tokens):
+        """送出messages並保留reserve_tokens給回答後，還可放入的token數"""
+        usable = int(self.num_ctx * self.safety_ratio) - reserve_tokens
+        return max(0, usable - self.estimate_messages(messages))
+
+    def truncate(self, text, max_tokens):
+        """截斷到約max_tokens個token"""
+        if self.estimate(text) <= max_tokens:
+            return text
+
+        limit = max_tokens / self.scale
+        used = 0.0
+        for i, char in enumerate(text):
+            used += DEFAULT_RATES[_char_script(char)]
+            if used > limit:
+                return text[:i]
+        return text
+
+    def observe(self, messages, prompt_eval_count, cached_messages=0):
+        """以Ollama回報的prompt token數更新校正比例
+
+        前綴命中KV cache時prompt_eval_count只計入新預填的部分，因此只與前cached_messages則訊息
+        (上一次請求已處理過的開頭) 之後的估算值比較；超出num_ctx時已被截斷，不列入校正。
+        """
+        if not prompt_eval_count or prompt_eval_count >= self.num_ctx:
+            return False
+
+        self._ensure_calibration()
+        with self._lock:
+            estimated = self.estimate_messages(messages[cached_messages:])
+            if not estimated:
+                return False
+
+            ratio = prompt_eval_count / estimated
+            if not 0.5 <= ratio <= 2.0:
+                return False
+
+            # 指數移動平均，前幾筆樣本的權重較高以便快速收斂
+            weight = max(0.2, 1.0 / (self.samples + 1))
+            self.scale *= 1 + weight * (ratio - 1)
+            self.samples += 1
+            self._save_calibration()
+        return True
+
+    def _load_calibration(self):
+        if not self.calibration_path or not os.path.exists(self.calibration_path):
+            return
+        try:
+            with open(self.calibration_path, 'r', encoding='utf-8') as f:
+                calibration = json.load(f).get(self.model_name)
+        except (OSError, ValueError):
+            return
+        if calibration:
+            self.scale = calibration.get('scale', 1.0)
+            self.samples = calibration.get('samples', 0)
+
+    def _save_calibration(self):
+        if not self.calibration_path:
+            return
+
+        calibrations = {}
+        if os.path.exists(self.calibration_path):
+            try:
+                with open(self.calibration_path, 'r', encoding='utf-8') as f:
+                    calibrations = json.load(f)
+            except (OSError, ValueError):
+                calibrations = {}
+        calibrations[self.model_name] = {'scale': round(self.scale, 4), 'samples': self.samples}
+
+        os.makedirs(os.path.dirname(self.calibration_path) or '.', exist_ok=True)
+        tmp_path = self.calibration_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(calibrations, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.calibration_path)
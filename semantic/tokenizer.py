@@ -0,0 +1,74 @@
+import re
+import hashlib
+import threading
+from functools import lru_cache
+
+import jieba
+
+from parser.financial_extractor import FINANCIAL_ITEMS
+
+# 財報常用詞，加入jieba詞典避免被切成單字或錯誤的組合
+FINANCE_TERMS = [
+    '營收', '毛利率', '營業利益率', '稅後淨利', '淨利率', '每股淨值', '股東權益', '股東權益報酬率',
+    '資產報酬率', '流動比率', '速動比率', '負債比率', '利息保障倍數', '存貨週轉率', '應收帳款週轉率',
+    '應收帳款', '應付帳款', '存貨', '自由現金流', '現金流量', '營業活動', '投資活動', '籌資活動',
+    '資本支出', '折舊', '攤銷', '現金股利', '股利政策', '合併財務報表', '綜合損益', '其他綜合損益',
+    '不動產、廠房及設備', '使用權資產', '無形資產', '長期投資', '短期借款', '長期借款', '公司債',
+    '先進製程', '晶圓', '產能利用率', '匯率', '毛利', '營業外收入', '財務結構', '資本結構'
+]
+
+# 不帶意義的符號與空白
+_NOISE_TOKEN = re.compile(r'^[\W_]+$')
+
+
+class ChineseTokenizer:
+    """jieba搜尋模式分詞 (含財報用語詞典)，供TfidfVectorizer的tokenizer使用
+
+    相同文字的分詞結果會被快取，建立索引與重複的查詢不必重新分詞。
+    """
+
+    def __init__(self, extra_terms=(), cache_size=20000):
+        terms = set(FINANCE_TERMS)
+        for labels in FINANCIAL_ITEMS.values():
+            terms.update(label for label in labels if not label.isascii())
+        terms.update(term for term in extra_terms if not term.isascii())
+        self.terms = sorted(terms)
+
+        self._jieba = None
+        self._jieba_lock = threading.Lock()
+        self._segment = lru_cache(maxsize=cache_size)(self._segment_text)
+
+    def __call__(self, text):
+        return list(self._segment(text))
+
+    def _segment_text(self, text):
+        tokenizer = self._get_jieba()
+        tokens = []
+        for token in tokenizer.cut_for_search(text.lower()):
+            token = token.strip()
+            # 與sklearn預設的token_pattern相同，不使用單一字元
+            if len(token) > 1 and not _NOISE_TOKEN.match(token):
+                tokens.append(token)
+        return tuple(tokens)
+
+    def _get_jieba(self):
+        """獨立的jieba實例，詞典在第一次分詞時才載入，不影響全域的jieba"""
+        with self._jieba_lock:
+            if self._jieba is None:
+                tokenizer = jieba.Tokenizer()
+                for term in self.terms:
+                    tokenizer.add_word(term)
+                self._jieba = tokenizer
+        return self._jieba
+    
+    def warm_up(self):
+        """在背景執行緒載入詞典，使用索引快取時第一個查詢不必等待"""
+        threading.Thread(target=self._get_jieba, daemon=True).start()
+
+    def get_config(self):
+        """影響分詞結果的設定，作為索引快取鍵的一部分"""
+        terms_hash = hashlib.sha256('\n'.join(self.terms).encode('utf-8')).hexdigest()[:16]
+        return {'name': 'jieba', 'version': jieba.__version__, 'mode': 'search', 'terms': terms_hash}
+
+    def cache_info(self):
+        return self._segment.cache_info()
@@ -0,0 +1,45 @@
+from parser.financial_extractor import FinancialValueExtractor
+
+# 台灣財報損益表的「金額 % 金額 %」排列
+INCOME_STATEMENT = (
+    "單位：新台幣仟元\n"
+    "112年度 111年度\n"
+    "金額 % 金額 %\n"
+    "營業收入淨額 $ 2,161,736,851 100 $ 2,263,891,292 100\n"
+    "營業毛利 1,175,110,580 54 1,348,354,635 60\n"
+    "基本每股盈餘 $ 32.34 $ 39.20"
+)
+
+
+def _facts(text):
+    financial_data = FinancialValueExtractor().extract(text, 1)
+    return {item: [(fact['period'], fact['value']) for fact in facts] for item, facts in financial_data.items()}
+
+
+def test_percent_columns_are_dropped():
+    facts = _facts(INCOME_STATEMENT)
+
+    assert facts['revenue'] == [('2023', 2161736851 * 1e3), ('2022', 2263891292 * 1e3)]
+    assert facts['gross_profit'] == [('2023', 1175110580 * 1e3), ('2022', 1348354635 * 1e3)]
+
+
+def test_percent_columns_without_header():
+    text = INCOME_STATEMENT.replace("金額 % 金額 %\n", "")
+
+    assert _facts(text)['gross_profit'] == [('2023', 1175110580 * 1e3), ('2022', 1348354635 * 1e3)]
+
+
+def test_small_values_are_not_taken_for_percent_columns():
+    assert _facts(INCOME_STATEMENT)['eps'] == [('2023', 32.34), ('2022', 39.2)]
+
+
+def test_more_columns_than_periods_have_no_period():
+    facts = _facts("112年度\n營業收入 1,000 2,000 3,000")
+
+    assert [period for period, _ in facts['revenue']] == [None, None, None]
+
+
+def test_ascii_labels_match_whole_words():
+    facts = _facts("see steps 3 and 4\nEPS 3.2")
+
+    assert facts == {'eps': [(None, 3.2)]}
@@ -0,0 +1,69 @@
+from analyzer.fact_store import FinancialFactStore
+from analyzer.numeric_diff import NumericDiffEngine, format_diff_table
+from parser.financial_extractor import FinancialValueExtractor
+
+# 112年報與113年報的損益表，兩份都附有前一年度的比較數 (2023年重疊)
+REPORT_112 = "單位：新台幣仟元\n112年度 111年度\n營業收入 2,161,736 2,263,891\n本期淨利 838,498 1,016,530"
+REPORT_113 = "單位：新台幣仟元\n113年度 112年度\n營業收入 2,894,308 2,161,736\n本期淨利 1,173,268 838,498"
+
+
+def _load(store, report, text):
+    financial_data = FinancialValueExtractor().extract(text, 1)
+    store.load_report(report, [{'page': 1, 'financial_data': financial_data}], source=report)
+
+
+def _compare(tmp_path):
+    store = FinancialFactStore(str(tmp_path / "facts.db"))
+    _load(store, "report_a", REPORT_112)
+    _load(store, "report_b", REPORT_113)
+    return NumericDiffEngine(store).compare("report_a", "report_b")
+
+
+def test_overlapping_periods_compare_latest_against_latest(tmp_path):
+    diffs = _compare(tmp_path)
+
+    latest = diffs['revenue'][0]
+    assert latest['basis'] == 'latest'
+    assert (latest['period_a'], latest['period_b']) == ('2023', '2024')
+    assert latest['delta'] == (2894308 - 2161736) * 1e3
+    assert latest['delta_pct'] == 33.89
+
+
+def test_overlapping_periods_keep_shared_period_rows(tmp_path):
+    diffs = _compare(tmp_path)
+
+    shared = [row for row in diffs['net_income'] if row['basis'] == 'same_period']
+    assert [(row['period_a'], row['period_b']) for row in shared] == [('2023', '2023')]
+    assert shared[0]['delta'] == 0
+
+    table = format_diff_table(diffs['net_income'])
+    assert "2023 / 2024 (最新期)" in table
+
+
+def test_same_latest_period_is_not_duplicated(tmp_path):
+    store = FinancialFactStore(str(tmp_path / "facts.db"))
+    _load(store, "report_a", REPORT_113)
+    _load(store, "report_b", REPORT_113)
+    diffs = NumericDiffEngine(store).compare("report_a", "report_b")
+
+    periods = [(row['period_a'], row['period_b'], row['basis']) for row in diffs['revenue']]
+    assert periods == [('2024', '2024', 'latest'), ('2023', '2023', 'same_period')]
+
+
+def test_conflicting_values_are_skipped(tmp_path):
+    store = FinancialFactStore(str(tmp_path / "facts.db"))
+    _load(store, "report_a", REPORT_112)
+    # 同一頁對同一 (項目, 期間) 出現兩個不同數值，無法判斷哪個正確
+    conflicting = {'revenue': [
+        {'value': 2894308000.0, 'unit': '元', 'period': '2024', 'page': 1},
+        {'value': 100000.0, 'unit': '元', 'period': '2024', 'page': 1},
+    ]}
+    store.load_report("report_b", [{'page': 1, 'financial_data': conflicting}], source="report_b")
+
+    engine = NumericDiffEngine(store)
+    diffs = engine.compare("report_a", "report_b")
+
+    assert 'revenue' not in diffs
+    assert engine.conflicts == [
+        {'report': 'report_b', 'item': 'revenue', 'period': '2024', 'values': [100000.0, 2894308000.0]}
+    ]